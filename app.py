@@ -7,17 +7,21 @@ from datetime import date, datetime
 from db_operations import (
     get_all_categories,
     add_category,
-    get_or_create_month,
-    save_portfolio_value,
-    get_portfolio_data,
-    get_all_months,
-    get_monthly_summary,
+    save_month_snapshot,
+    get_portfolio_data_page,
+    get_portfolio_data_stats,
     delete_category,
-    get_portfolio_value_history
+    get_dashboard_bundle,
+    prefetch
 )
-from chat_agent import PortfolioChatAgent
+from db_notify import start_cache_listener
+from db_cache import cache, data_token
+import db_metrics
 import os
-import plotly.graph_objects as go
+
+# Plotly and the chatbot stack (chat_agent -> LangChain, OpenAI, SQLAlchemy)
+# are imported where they are first used, not here: the chatbot stack alone
+# adds ~2 s to every cold start. bench_startup.py guards this.
 
 # Page configuration
 st.set_page_config(
@@ -26,6 +30,9 @@ st.set_page_config(
     layout="wide"
 )
 
+# Evict cached reads when another process writes (runs once per process)
+start_cache_listener()
+
 # Custom CSS for better styling
 st.markdown("""
 <style>
@@ -451,37 +458,102 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 # Initialize session state
-if 'refresh' not in st.session_state:
-    st.session_state.refresh = 0
 if 'show_numbers' not in st.session_state:
     st.session_state.show_numbers = False  # Hide numbers by default
 
+# Rows per page in the View History tab
+HISTORY_PAGE_SIZE = 100
+
+
+# ------------------------------------------------------------------
+# Cached page loaders
+# ------------------------------------------------------------------
+# Streamlit reruns the whole script on every interaction. These loaders
+# are memoized with st.cache_data and keyed on data_token(), which only
+# changes when a writer (in this or - via db_notify - another process)
+# touches the data. UI-only reruns (privacy toggle, selectboxes, chat)
+# therefore do no database work. TTL follows DB_CACHE_TTL.
+
+class _DoNotCache(Exception):
+    """Raised inside a loader so an empty (possibly failed) read is not memoized."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+def _load(loader, *args):
+    try:
+        return loader(*args, token=data_token())
+    except _DoNotCache as e:
+        return e.value
+
+
+@st.cache_data(ttl=cache.ttl, show_spinner=False)
+def _load_dashboard(year, month, token=None):
+    bundle = get_dashboard_bundle(year, month, num_months=6)
+    if not bundle:
+        raise _DoNotCache(bundle)
+    return bundle
+
+
+@st.cache_data(ttl=cache.ttl, show_spinner=False)
+def _load_categories(token=None):
+    categories = get_all_categories()
+    if not categories:
+        raise _DoNotCache(categories)
+    return categories
+
+
+@st.cache_data(ttl=cache.ttl, show_spinner=False)
+def _load_history(year, month, after, token=None):
+    # The page and the summary statistics are independent - fetch them in parallel
+    results = prefetch(
+        page=(get_portfolio_data_page, year, month, after, HISTORY_PAGE_SIZE),
+        stats=(get_portfolio_data_stats, year, month)
+    )
+    if not results['page'][0]:
+        raise _DoNotCache(results)
+    return results
+
+def _keep_view():
+    """Clicking the active view deselects it; stay on it instead (?view= still holds it)."""
+    if st.session_state.view is None:
+        st.session_state.view = st.query_params.get("view", "dashboard")
+
 def main():
     st.title("💰 Portfolio Management System")
     st.markdown("---")
     
-    # Create tabs
-    tabs = st.tabs(["📊 Dashboard", "➕ Add Data", "🏷️ Manage Categories", "📈 View History", "🤖 AI Chatbot"])
-    
-    # Tab 1: Dashboard
-    with tabs[0]:
-        show_dashboard()
-    
-    # Tab 2: Add Data
-    with tabs[1]:
-        show_add_data()
+    # Navigation: only the selected view runs, so a rerun costs one page's
+    # queries. st.tabs would execute every tab body on every rerun.
+    views = {
+        "dashboard": ("📊 Dashboard", show_dashboard),
+        "add-data": ("➕ Add Data", show_add_data),
+        "categories": ("🏷️ Manage Categories", show_manage_categories),
+        "history": ("📈 View History", show_history),
+        "chatbot": ("🤖 AI Chatbot", show_chatbot),
+    }
     
-    # Tab 3: Manage Categories
-    with tabs[2]:
-        show_manage_categories()
+    # Keep the view across browser reloads / bookmarks via ?view=
+    if st.session_state.get("view") not in views:
+        requested = st.query_params.get("view")
+        st.session_state.view = requested if requested in views else "dashboard"
+    
+    view = st.segmented_control(
+        "View",
+        options=list(views),
+        format_func=lambda slug: views[slug][0],
+        key="view",
+        on_change=_keep_view,
+        label_visibility="collapsed"
+    )
+    st.query_params["view"] = view
     
-    # Tab 4: View History
-    with tabs[3]:
-        show_history()
+    views[view][1]()
     
-    # Tab 5: AI Chatbot
-    with tabs[4]:
-        show_chatbot()
+    # Optional timing panel (set DB_DEBUG_PANEL=1 in .env)
+    if os.getenv('DB_DEBUG_PANEL'):
+        show_db_metrics()
 
 def format_currency(amount, show_numbers=True):
     """Format currency value based on visibility preference"""
@@ -490,28 +562,30 @@ def format_currency(amount, show_numbers=True):
     else:
         return "₹••••••"
 
+def _flip_numbers():
+    st.session_state.show_numbers = not st.session_state.show_numbers
+
+def privacy_toggle(key):
+    """🔒/👁️ button. Call it inside an @st.fragment: a click then reruns only that fragment."""
+    if st.session_state.show_numbers:
+        st.button("🔒", key=f"hide_{key}", help="Hide numbers for privacy", on_click=_flip_numbers)
+    else:
+        st.button("👁️", key=f"show_{key}", help="Show numbers", on_click=_flip_numbers)
+
 def show_dashboard():
     """Display portfolio dashboard with summary"""
-    col_header, col_icon = st.columns([6, 1])
-    
-    with col_header:
-        st.header("Portfolio Dashboard")
-    
-    with col_icon:
-        st.markdown("")  # Add spacing to align with header
-        if st.session_state.show_numbers:
-            if st.button("🔒", key="hide_dash", help="Hide numbers for privacy"):
-                st.session_state.show_numbers = False
-                st.rerun()
-        else:
-            if st.button("👁️", key="show_dash", help="Show numbers"):
-                st.session_state.show_numbers = True
-                st.rerun()
+    st.header("Portfolio Dashboard")
     
     st.markdown("---")
     
-    # Get all months
-    months = get_all_months()
+    # Load months, summary, history and breakdown in one round trip.
+    # Widget state from the previous run tells us which month is selected.
+    bundle = _load(
+        _load_dashboard,
+        st.session_state.get('dash_year'),
+        st.session_state.get('dash_month')
+    )
+    months = bundle.get('months', [])
     
     if not months:
         st.info("📝 No portfolio data yet. Start by adding categories and data!")
@@ -541,11 +615,29 @@ def show_dashboard():
             st.warning("No data for selected year")
             return
     
+    # Reload only if the widgets settled on a different month than we fetched
+    if (bundle['year'], bundle['month']) != (selected_year, selected_month):
+        bundle = _load(_load_dashboard, selected_year, selected_month)
+    
+    dashboard_panels(bundle)
+
+@st.fragment
+def dashboard_panels(bundle):
+    """
+    Summary, growth chart and breakdown for an already-loaded bundle.
+    
+    A fragment: the privacy toggle reruns only this function, re-rendering
+    from the same bundle without reloading data or rerunning the page.
+    """
     # Get summary
-    summary = get_monthly_summary(selected_year, selected_month)
+    summary = bundle.get('summary', {})
     
     if summary:
-        st.markdown("### 📊 Summary")
+        col_title, col_icon = st.columns([6, 1])
+        with col_title:
+            st.markdown("### 📊 Summary")
+        with col_icon:
+            privacy_toggle("dash")
         st.markdown("")  # Add spacing
         col1, col2, col3 = st.columns(3)
         
@@ -569,7 +661,7 @@ def show_dashboard():
         st.markdown("")  # Add spacing
         
         # Get historical data
-        history = get_portfolio_value_history(num_months=6)
+        history = bundle.get('history', [])
         
         if history and len(history) > 0:
             # Create DataFrame for visualization
@@ -600,6 +692,8 @@ def show_dashboard():
                 all_values = list(history_df['total_value']) + [0, 0, 0]
                 
                 # Create attractive Plotly bar chart
+                import plotly.graph_objects as go
+                
                 fig = go.Figure()
                 
                 # Create gradient colors based on values (darker green for higher values)
@@ -758,7 +852,7 @@ def show_dashboard():
         st.markdown("")  # Add spacing
         
         # Get detailed data
-        data = get_portfolio_data(selected_year, selected_month)
+        data = bundle.get('breakdown', [])
         
         if data:
             st.markdown("---")
@@ -785,7 +879,7 @@ def show_add_data():
     st.markdown("")  # Add spacing
     
     # Get categories
-    categories = get_all_categories()
+    categories = _load(_load_categories)
     
     if not categories:
         st.warning("⚠️ No categories available. Please add categories first in 'Manage Categories' tab.")
@@ -836,8 +930,9 @@ def show_add_data():
         submitted = st.form_submit_button("💾 Save All Values", use_container_width=True)
         
         if submitted:
-            # Get or create month
-            month_id = get_or_create_month(year, month, snapshot_date)
+            # Create the month (if needed) and save all non-zero values in one round trip
+            amounts = {category_id: amount for category_id, amount in values.items() if amount > 0}
+            month_id, results = save_month_snapshot(year, month, snapshot_date, amounts)
             
             if not month_id:
                 st.error("❌ Error creating month entry in database")
@@ -846,15 +941,12 @@ def show_add_data():
             success_count = 0
             error_count = 0
             
-            # Save each value
-            for category_id, amount in values.items():
-                if amount > 0:  # Only save non-zero values
-                    success, message = save_portfolio_value(month_id, category_id, amount)
-                    if success:
-                        success_count += 1
-                    else:
-                        error_count += 1
-                        st.error(f"❌ {message}")
+            for category_id, (success, message) in results.items():
+                if success:
+                    success_count += 1
+                else:
+                    error_count += 1
+                    st.error(f"❌ {message}")
             
             if success_count > 0:
                 st.success(f"✅ Successfully saved {success_count} portfolio value(s)!")
@@ -889,7 +981,6 @@ def show_manage_categories():
                 success, message = add_category(new_category_name.strip(), new_category_desc.strip())
                 if success:
                     st.success(f"✅ {message}")
-                    st.session_state.refresh += 1
                     st.rerun()
                 else:
                     st.error(f"❌ {message}")
@@ -899,7 +990,7 @@ def show_manage_categories():
     st.markdown("")  # Add spacing
     
     # Display existing categories
-    categories = get_all_categories()
+    categories = _load(_load_categories)
     
     if not categories:
         st.info("📝 No categories yet. Add your first category above!")
@@ -944,21 +1035,7 @@ def show_manage_categories():
 
 def show_history():
     """View portfolio history"""
-    col_header, col_icon = st.columns([6, 1])
-    
-    with col_header:
-        st.header("Portfolio History")
-    
-    with col_icon:
-        st.markdown("")  # Add spacing to align with header
-        if st.session_state.show_numbers:
-            if st.button("🔒", key="hide_history", help="Hide numbers for privacy"):
-                st.session_state.show_numbers = False
-                st.rerun()
-        else:
-            if st.button("👁️", key="show_history", help="Show numbers"):
-                st.session_state.show_numbers = True
-                st.rerun()
+    st.header("Portfolio History")
     
     st.markdown("---")
     
@@ -986,15 +1063,41 @@ def show_history():
                           'July', 'August', 'September', 'October', 'November', 'December']
             month_filter = st.selectbox("Month", range(1, 13), format_func=lambda x: month_names[x-1])
     
-    # Get data
-    data = get_portfolio_data(year_filter, month_filter)
+    # Keyset pagination: history_page_keys[i] is the key page i starts after.
+    # Changing the filters starts again from the first page.
+    filter_key = (filter_option, year_filter, month_filter)
+    if st.session_state.get('history_filter') != filter_key:
+        st.session_state.history_filter = filter_key
+        st.session_state.history_page_keys = [None]
+    page_keys = st.session_state.history_page_keys
+    
+    # Get one page of data and the summary statistics
+    results = _load(_load_history, year_filter, month_filter, page_keys[-1])
+    data, next_key = results['page']
+    stats = results['stats']
     
     if not data:
         st.info("📝 No portfolio history found for the selected filters.")
         return
     
+    history_panels(data, next_key, stats)
+
+@st.fragment
+def history_panels(data, next_key, stats):
+    """
+    One page of history, page navigation and summary statistics.
+    
+    A fragment: the privacy toggle reruns only this function with the
+    same page; Previous / Next still rerun the page to load another one.
+    """
+    page_keys = st.session_state.history_page_keys
+    
     st.markdown("---")
-    st.markdown("### 📊 Historical Data")
+    col_title, col_icon = st.columns([6, 1])
+    with col_title:
+        st.markdown("### 📊 Historical Data")
+    with col_icon:
+        privacy_toggle("history")
     st.markdown("")  # Add spacing
     
     # Display data
@@ -1012,27 +1115,68 @@ def show_history():
     
     st.dataframe(display_df, use_container_width=True, hide_index=True)
     
-    # Summary statistics
+    # Page navigation
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+    with col_prev:
+        if st.button("⬅️ Previous", key="history_prev", disabled=len(page_keys) == 1, use_container_width=True):
+            page_keys.pop()
+            st.rerun()
+    with col_page:
+        st.markdown(f"<div style='text-align: center;'>Page {len(page_keys)}</div>", unsafe_allow_html=True)
+    with col_next:
+        if st.button("Next ➡️", key="history_next", disabled=next_key is None, use_container_width=True):
+            page_keys.append(next_key)
+            st.rerun()
+    
+    # Summary statistics (aggregated in the database over all pages)
     st.markdown("---")
     st.markdown("### 📈 Summary Statistics")
     st.markdown("")  # Add spacing
     
     col1, col2, col3 = st.columns(3)
     
-    numeric_df = pd.DataFrame(data)
-    
     with col1:
-        total_records = len(numeric_df)
-        st.metric("Total Records", total_records)
+        st.metric("Total Records", stats.get('total_records', 0))
     
     with col2:
-        unique_months = numeric_df[['year', 'month']].drop_duplicates()
-        st.metric("Unique Months", len(unique_months))
+        st.metric("Unique Months", stats.get('unique_months', 0))
     
     with col3:
-        total_value = numeric_df['amount'].sum()
+        total_value = stats.get('total_value', 0)
         st.metric("Total Value (All)", format_currency(total_value, st.session_state.show_numbers))
 
+def show_db_metrics():
+    """Sidebar panel with per-function DB timings from db_metrics"""
+    with st.sidebar:
+        with st.expander("⏱️ DB Timings", expanded=False):
+            snapshot = db_metrics.snapshot()
+            rows = []
+            for operation, phases in snapshot['operations'].items():
+                total = phases.get('total', {})
+                rows.append({
+                    "Function": operation,
+                    "Calls": total.get('count', 0),
+                    "Mean ms": total.get('mean', 0),
+                    "p95 ms": total.get('p95', 0),
+                    "Connect ms": phases.get('connect', {}).get('mean', 0),
+                    "Execute ms": phases.get('execute', {}).get('mean', 0),
+                    "Fetch ms": phases.get('fetch', {}).get('mean', 0),
+                    "Rows": phases.get('rows', {}).get('mean', 0),
+                })
+            if rows:
+                st.dataframe(pd.DataFrame(rows), use_container_width=True, hide_index=True)
+            else:
+                st.caption("No database calls recorded yet.")
+            
+            slow = snapshot['slow_queries']
+            st.caption(f"Slow queries (≥ {snapshot['slow_query_ms']:.0f} ms): {len(slow)}")
+            for entry in reversed(slow[-5:]):
+                st.code(f"{entry['operation']} · {entry['elapsed_ms']:.1f} ms\n{entry['query']}\nparams={entry['params']}")
+            
+            if st.button("Reset timings", key="reset_db_metrics", use_container_width=True):
+                db_metrics.reset()
+                st.rerun()
+
 def show_chatbot():
     """AI Chatbot for natural language database queries"""
     st.header("🤖 AI Portfolio Assistant")
@@ -1057,6 +1201,7 @@ def show_chatbot():
     # Initialize chat agent
     if 'chat_agent' not in st.session_state or st.session_state.chat_agent is None:
         with st.spinner("🔄 Initializing AI agent..."):
+            from chat_agent import PortfolioChatAgent
             agent = PortfolioChatAgent(openai_api_key)
             if agent.initialize():
                 st.session_state.chat_agent = agent
@@ -0,0 +1,255 @@
+"""
+Benchmark: multi-step SQL agent vs single-shot NL-to-SQL
+
+Runs the same questions through PortfolioChatAgent in "agent" and
+"single_shot" mode (see CHAT_AGENT_MODE in chat_agent.py) and reports, per
+question and in total, the number of LLM calls, tokens where the API
+reports them, and wall time. Templates, the answer cache and saved SQL
+plans are bypassed, so every question really goes to the model.
+
+Needs a database with data (the one configured in .env) and, unless
+--fake is given, OPENAI_API_KEY: the default run makes live API calls.
+It never writes to the database.
+
+--fake swaps the model for ScriptedChatModel, which needs no network: it
+answers every question with a scripted SQL query (FAKE_SQL, or --script)
+and sleeps --fake-latency-ms per call to stand in for the API round trip.
+The agent still goes through its real tool loop (query checker, query,
+final answer), so the call counts are the ones each mode would make; the
+wall times are the simulated latency plus the real local work.
+
+Usage:
+    python bench_chat.py [--questions questions.txt] [--modes agent single_shot]
+                         [--repeat 1] [--summary] [--show-answers]
+                         [--fake] [--fake-latency-ms 800] [--script script.json]
+
+--questions takes one question per line (default: the suggested questions).
+--script is a JSON object {question: SQL} for --fake (default: FAKE_SQL).
+"""
+
+import argparse
+import json
+import os
+import statistics
+import time
+from typing import Dict
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, FunctionMessage, HumanMessage, SystemMessage, ToolMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+import chat_agent
+from chat_agent import PortfolioChatAgent
+from db_config import close_pool
+
+
+class LLMCallCounter(BaseCallbackHandler):
+    """Counts chat model calls and the tokens they report."""
+
+    def __init__(self):
+        self.calls = 0
+        self.tokens = 0
+
+    def on_chat_model_start(self, serialized, messages, **kwargs):
+        self.calls += 1
+
+    def on_llm_start(self, serialized, prompts, **kwargs):
+        self.calls += 1
+
+    def on_llm_end(self, response, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self.tokens += usage.get("total_tokens", 0)
+
+
+# --fake: SQL for the suggested questions (portable between PostgreSQL and SQLite)
+_MONTH_TOTALS = """
+    SELECT pm.year, pm.month, SUM(pv.amount) AS total_value
+    FROM portfolio_value pv
+    JOIN portfolio_month pm ON pv.month_id = pm.month_id
+    {where}
+    GROUP BY pm.year, pm.month
+    ORDER BY pm.year DESC, pm.month DESC
+    {limit}
+"""
+
+FAKE_SQL = {
+    "What is my total portfolio value for the latest month?":
+        _MONTH_TOTALS.format(where="", limit="LIMIT 1"),
+    "Show me all investment categories":
+        "SELECT category_name, description FROM investment_category WHERE is_active = TRUE ORDER BY category_name",
+    "What was my portfolio value in December 2024?":
+        _MONTH_TOTALS.format(where="WHERE pm.year = 2024 AND pm.month = 12", limit=""),
+    "Which category has the highest investment?": """
+        SELECT ic.category_name, pv.amount
+        FROM portfolio_value pv
+        JOIN investment_category ic ON pv.category_id = ic.category_id
+        WHERE pv.month_id = (SELECT month_id FROM portfolio_month ORDER BY year DESC, month DESC LIMIT 1)
+        ORDER BY pv.amount DESC
+        LIMIT 1
+    """,
+    "Show me the trend of my portfolio over the last 6 months":
+        _MONTH_TOTALS.format(where="", limit="LIMIT 6"),
+    "What is the average portfolio value per month?": """
+        SELECT AVG(total_value) AS average_value
+        FROM (SELECT month_id, SUM(amount) AS total_value FROM portfolio_value GROUP BY month_id) t
+    """,
+    "List all months where I have portfolio data":
+        "SELECT year, month FROM portfolio_month ORDER BY year DESC, month DESC",
+    "Compare my portfolio values between different months":
+        _MONTH_TOTALS.format(where="", limit=""),
+    "What are my active investment categories?":
+        "SELECT category_name FROM investment_category WHERE is_active = TRUE ORDER BY category_name",
+    "Show me the growth rate of my portfolio":
+        _MONTH_TOTALS.format(where="", limit="LIMIT 12"),
+}
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    Offline stand-in for ChatOpenAI that plays the part each prompt expects:
+
+    - single-shot prompt: the scripted SQL (or NONE)
+    - SQL agent: call sql_db_query_checker, then sql_db_query, then answer
+      from the query's result (or "I don't know" without a script entry)
+    - query checker: the query back unchanged
+    - single-shot summary: a canned sentence
+    """
+
+    script: Dict[str, str]
+    latency_ms: float = 800
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def _reply(self, messages) -> AIMessage:
+        system = next((m.content for m in messages if isinstance(m, SystemMessage)), "")
+        human = next((m.content for m in messages if isinstance(m, HumanMessage)), "")
+
+        if "Double check the" in human:
+            return AIMessage(content=human.split("Double check the")[0].strip())
+        if system.startswith("Answer the user's question"):
+            return AIMessage(content="Here is what the query returned.")
+
+        sql = self.script.get(human)
+        if system.startswith("Write one"):
+            return AIMessage(content=" ".join(sql.split()) if sql else "NONE")
+
+        # SQL agent: one step per tool result so far
+        observations = [m.content for m in messages if isinstance(m, (FunctionMessage, ToolMessage))]
+        if sql is None:
+            return AIMessage(content="I don't know.")
+        if len(observations) < 2:
+            tool = "sql_db_query_checker" if not observations else "sql_db_query"
+            return AIMessage(content="", additional_kwargs={
+                "function_call": {"name": tool, "arguments": json.dumps({"query": " ".join(sql.split())})}
+            })
+        return AIMessage(content=f"Based on the query results: {observations[-1]}")
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        time.sleep(self.latency_ms / 1000)
+        message = self._reply(messages)
+        # Rough token estimate (~4 characters per token), as the API would report it
+        characters = sum(len(str(m.content)) for m in messages) + len(message.content)
+        return ChatResult(
+            generations=[ChatGeneration(message=message)],
+            llm_output={"token_usage": {"total_tokens": characters // 4}}
+        )
+
+
+def run_question(agent: PortfolioChatAgent, counter: LLMCallCounter, question: str) -> dict:
+    counter.calls = counter.tokens = 0
+    start = time.perf_counter()
+    try:
+        output, sql = agent._answer(question)
+        error = None
+    except Exception as e:
+        output, sql, error = None, None, str(e)
+    return {
+        "ms": (time.perf_counter() - start) * 1000,
+        "calls": counter.calls,
+        "tokens": counter.tokens,
+        "output": output,
+        "sql": sql,
+        "error": error,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SQL agent vs single-shot benchmark")
+    parser.add_argument("--questions", help="file with one question per line")
+    parser.add_argument("--modes", nargs="+", default=["agent", "single_shot"], choices=["agent", "single_shot"])
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--summary", action="store_true", help="single_shot: phrase results with one extra call")
+    parser.add_argument("--show-answers", action="store_true")
+    parser.add_argument("--fake", action="store_true", help="use the scripted offline model instead of the API")
+    parser.add_argument("--fake-latency-ms", type=float, default=800, help="simulated round trip per --fake call")
+    parser.add_argument("--script", help="--fake: JSON file {question: SQL} (default: FAKE_SQL)")
+    args = parser.parse_args()
+
+    api_key = os.getenv("OPENAI_API_KEY")
+    if args.fake:
+        script = FAKE_SQL
+        if args.script:
+            with open(args.script, encoding="utf-8") as f:
+                script = json.load(f)
+    elif not api_key:
+        print("[ERROR] OPENAI_API_KEY is not set (or pass --fake to run offline)")
+        return
+
+    chat_agent.SINGLE_SHOT_SUMMARY = args.summary
+
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            questions = [line.strip() for line in f if line.strip()]
+    else:
+        questions = PortfolioChatAgent(api_key).get_suggested_questions()
+
+    print("=" * 60)
+    print("Chat Mode Benchmark")
+    print("=" * 60)
+    print()
+    print(f"[INFO] {len(questions)} question(s) x {args.repeat}, modes: {', '.join(args.modes)}")
+    if args.fake:
+        print(f"[INFO] Scripted model, {args.fake_latency_ms:.0f} ms simulated latency per call (no API calls)")
+
+    try:
+        results = {}
+        for mode in args.modes:
+            llm = ScriptedChatModel(script=script, latency_ms=args.fake_latency_ms) if args.fake else None
+            agent = PortfolioChatAgent(api_key, mode=mode, llm=llm)
+            if not agent.initialize():
+                print(f"[ERROR] Could not initialize the {mode} agent")
+                return
+            counter = LLMCallCounter()
+            agent.llm.callbacks = [counter]     # the agent, query checker and single-shot calls all use it
+
+            print()
+            print(f"--- {mode} ---")
+            results[mode] = []
+            for question in questions:
+                for _ in range(args.repeat):
+                    result = run_question(agent, counter, question)
+                    results[mode].append(result)
+                    status = "ERROR " + result["error"] if result["error"] else f"{result['calls']} call(s)"
+                    print(f"   {question[:48]:<48} {result['ms']:>9.1f} ms  {status}")
+                    if args.show_answers and result["output"]:
+                        print(f"      SQL: {result['sql']}")
+                        print("      " + result["output"].replace("\n", "\n      "))
+
+        print()
+        print(f"   {'mode':<14} {'median ms':>10} {'mean calls':>11} {'tokens':>9} {'errors':>7}")
+        for mode, runs in results.items():
+            print(
+                f"   {mode:<14} {statistics.median(r['ms'] for r in runs):>10.1f} "
+                f"{statistics.mean(r['calls'] for r in runs):>11.2f} "
+                f"{sum(r['tokens'] for r in runs):>9} "
+                f"{sum(1 for r in runs if r['error']):>7}"
+            )
+    finally:
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+"""
+Benchmark: dict rows (RealDictCursor) vs columnar readers
+
+Builds a synthetic history in a throwaway schema (default 100 categories
+x 1000 months = 100k portfolio_value rows), then times:
+- get_portfolio_data()          + pd.DataFrame(...)   (current dict path)
+- get_portfolio_data_frame()                          (COPY -> typed columns)
+- get_portfolio_value_history() + pd.DataFrame(...)
+- get_portfolio_value_history_frame()
+
+Usage:
+    python bench_columnar.py [--categories 100] [--months 1000] [--repeat 5] [--keep]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+BENCH_SCHEMA = "portfolio_bench"
+
+# Point every pooled connection at the benchmark schema and bypass the
+# read cache. Both must be set before db_config / db_cache are imported.
+os.environ["PGOPTIONS"] = f"-c search_path={BENCH_SCHEMA}"
+os.environ["DB_CACHE_TTL"] = "0"
+
+import pandas as pd
+
+from db_config import get_db_connection, close_connection, close_pool
+from db_operations import (
+    get_portfolio_data,
+    get_portfolio_data_frame,
+    get_portfolio_value_history,
+    get_portfolio_value_history_frame
+)
+from migrations import migrate
+
+
+def build_history(num_categories: int, num_months: int) -> bool:
+    """(Re)create the benchmark schema and fill it with synthetic data."""
+    connection = get_db_connection()
+    if not connection:
+        print("[ERROR] Failed to connect to database")
+        return False
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        cursor.execute(f"CREATE SCHEMA {BENCH_SCHEMA}")
+        connection.commit()
+    finally:
+        if cursor:
+            cursor.close()
+        close_connection(connection)
+
+    if not migrate():
+        return False
+
+    connection = get_db_connection()
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            INSERT INTO investment_category (category_name, description)
+            SELECT 'cat_' || lpad(g::text, 4, '0'), 'synthetic'
+            FROM generate_series(1, %s) g
+        """, (num_categories,))
+        cursor.execute("""
+            INSERT INTO portfolio_month (year, month, snapshot_date)
+            SELECT 1900 + (g - 1) / 12, (g - 1) %% 12 + 1,
+                   make_date(1900 + (g - 1) / 12, (g - 1) %% 12 + 1, 28)
+            FROM generate_series(1, %s) g
+        """, (num_months,))
+        cursor.execute("""
+            INSERT INTO portfolio_value (month_id, category_id, amount)
+            SELECT pm.month_id, ic.category_id, round((random() * 100000)::numeric, 2)
+            FROM portfolio_month pm
+            CROSS JOIN investment_category ic
+        """)
+        cursor.execute("ANALYZE")
+        connection.commit()
+        return True
+    except Exception as e:
+        print(f"[ERROR] Error building synthetic history: {e}")
+        connection.rollback()
+        return False
+    finally:
+        if cursor:
+            cursor.close()
+        close_connection(connection)
+
+
+def drop_history():
+    connection = get_db_connection()
+    if not connection:
+        return
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"DROP SCHEMA IF EXISTS {BENCH_SCHEMA} CASCADE")
+        connection.commit()
+    finally:
+        if cursor:
+            cursor.close()
+        close_connection(connection)
+
+
+def timed(func, repeat: int):
+    """Median wall time in ms over repeat runs (after one warm-up), plus the last result."""
+    result = func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def dict_portfolio_data():
+    df = pd.DataFrame(get_portfolio_data())
+    df["amount"] = df["amount"].astype(float)
+    return df
+
+
+def dict_value_history(num_months: int):
+    df = pd.DataFrame(get_portfolio_value_history(num_months))
+    df["total_value"] = df["total_value"].astype(float)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Dict vs columnar reader benchmark")
+    parser.add_argument("--categories", type=int, default=100)
+    parser.add_argument("--months", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--keep", action="store_true", help=f"keep the {BENCH_SCHEMA} schema afterwards")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Columnar Reader Benchmark")
+    print("=" * 60)
+    print()
+    print(f"[INFO] Building {args.categories * args.months:,} synthetic rows in schema '{BENCH_SCHEMA}'...")
+    if not build_history(args.categories, args.months):
+        return
+
+    try:
+        cases = [
+            ("get_portfolio_data (dict rows)", dict_portfolio_data),
+            ("get_portfolio_data_frame (columnar)", get_portfolio_data_frame),
+            ("get_portfolio_value_history (dict rows)", lambda: dict_value_history(args.months)),
+            ("get_portfolio_value_history_frame (columnar)", lambda: get_portfolio_value_history_frame(args.months)),
+        ]
+        results = {}
+        print()
+        for name, func in cases:
+            ms, df = timed(func, args.repeat)
+            results[name] = (ms, df)
+            print(f"   {name:<48} {ms:>9.1f} ms  ({len(df):,} rows)")
+
+        dict_ms = results["get_portfolio_data (dict rows)"][0]
+        frame_ms = results["get_portfolio_data_frame (columnar)"][0]
+        print()
+        print(f"[INFO] Columnar get_portfolio_data speed-up: {dict_ms / frame_ms:.1f}x")
+
+        dict_df = results["get_portfolio_data (dict rows)"][1]
+        frame_df = results["get_portfolio_data_frame (columnar)"][1]
+        same = (
+            len(dict_df) == len(frame_df)
+            and (dict_df["category_name"].tolist() == frame_df["category_name"].tolist())
+            and ((dict_df["amount"] - frame_df["amount"]).abs().max() < 0.005)
+        )
+        print(f"[INFO] Results match: {same}")
+    finally:
+        if not args.keep:
+            drop_history()
+        close_pool()
+
+
+if __name__ == "__main__":
+    main()
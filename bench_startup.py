@@ -0,0 +1,147 @@
+"""
+Benchmark: app.py cold start
+
+Each sample runs in a fresh Python process, so nothing is already imported
+or cached in memory:
+- import       importing app.py's top-level imports (read from its source)
+- first paint  one full run of app.py in Streamlit's AppTest harness with
+               the default view (dashboard), against the configured database;
+               includes the app's own imports and data loading
+
+After the first paint it also checks that none of DEFERRED_MODULES was
+imported. Those only belong on the chatbot page / behind the growth chart.
+
+Usage:
+    python bench_startup.py [--repeat 5] [--max-import-ms N] [--max-paint-ms N]
+
+Exits with status 1 when a threshold is exceeded or a deferred module was
+loaded, so it can run in CI.
+"""
+
+import argparse
+import ast
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+# Heavy modules that must not be imported to render the dashboard
+DEFERRED_MODULES = (
+    "chat_agent",
+    "langchain_community",
+    "langchain_openai",
+    "openai",
+    "sqlalchemy",
+    "plotly",
+)
+
+
+def app_imports() -> list:
+    """Modules app.py imports at module level."""
+    with open(APP, encoding="utf-8") as f:
+        tree = ast.parse(f.read())
+    modules = []
+    for node in tree.body:
+        if isinstance(node, ast.Import):
+            modules.extend(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module:
+            modules.append(node.module)
+    return modules
+
+
+def child_import():
+    import importlib
+    start = time.perf_counter()
+    for module in app_imports():
+        importlib.import_module(module)
+    return {"ms": (time.perf_counter() - start) * 1000}
+
+
+def child_paint():
+    # The harness itself is not part of the app's startup
+    from streamlit.testing.v1 import AppTest
+    before = set(sys.modules)
+
+    start = time.perf_counter()
+    at = AppTest.from_file(APP, default_timeout=120).run()
+    ms = (time.perf_counter() - start) * 1000
+
+    loaded = set(sys.modules) - before
+    return {
+        "ms": ms,
+        "errors": [str(e.value) for e in at.exception],
+        "deferred_loaded": sorted(
+            module for module in DEFERRED_MODULES
+            if module in loaded
+        ),
+    }
+
+
+def sample(phase: str) -> dict:
+    """Run one phase in a fresh interpreter and return its result."""
+    output = subprocess.run(
+        [sys.executable, __file__, "--child", phase],
+        cwd=os.path.dirname(APP),
+        capture_output=True,
+        text=True,
+        check=True
+    ).stdout
+    # The last line is ours; the app may print before it
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="app.py cold start benchmark")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--max-import-ms", type=float, help="fail if the median import time is higher")
+    parser.add_argument("--max-paint-ms", type=float, help="fail if the median first paint is higher")
+    parser.add_argument("--child", choices=["import", "paint"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        result = child_import() if args.child == "import" else child_paint()
+        print(json.dumps(result))
+        return 0
+
+    print("=" * 60)
+    print("Startup Benchmark")
+    print("=" * 60)
+    print()
+    print(f"[INFO] {args.repeat} fresh process(es) per phase, medians reported")
+
+    import_ms = statistics.median(sample("import")["ms"] for _ in range(args.repeat))
+    paints = [sample("paint") for _ in range(args.repeat)]
+    paint_ms = statistics.median(paint["ms"] for paint in paints)
+
+    print()
+    print(f"   {'import (app.py top-level imports)':<40} {import_ms:>9.1f} ms")
+    print(f"   {'first paint (dashboard)':<40} {paint_ms:>9.1f} ms")
+    print()
+
+    failed = False
+    errors = paints[-1]["errors"]
+    if errors:
+        print(f"[ERROR] app.py raised during the first paint: {errors}")
+        failed = True
+    deferred = sorted({module for paint in paints for module in paint["deferred_loaded"]})
+    if deferred:
+        print(f"[ERROR] Deferred modules imported by the first paint: {', '.join(deferred)}")
+        failed = True
+    else:
+        print(f"[INFO] No deferred module imported ({', '.join(DEFERRED_MODULES)})")
+    if args.max_import_ms is not None and import_ms > args.max_import_ms:
+        print(f"[ERROR] Import time {import_ms:.1f} ms exceeds {args.max_import_ms:.1f} ms")
+        failed = True
+    if args.max_paint_ms is not None and paint_ms > args.max_paint_ms:
+        print(f"[ERROR] First paint {paint_ms:.1f} ms exceeds {args.max_paint_ms:.1f} ms")
+        failed = True
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -4,33 +4,277 @@ Allows natural language queries on portfolio data
 
 Database backend:
 - PostgreSQL (Neon)
+- SQLite when DB_BACKEND=sqlite
+
+Common questions are answered from templates without the LLM (see
+chat_intents.py); agent answers are cached until the portfolio data
+changes (see "Answer cache"), and the agent's SQL is kept to re-run for
+later questions of the same shape (see chat_plans.py).
 """
 
 from langchain_community.agent_toolkits import create_sql_agent
 from langchain_community.utilities import SQLDatabase
 from langchain_community.agent_toolkits.sql.toolkit import SQLDatabaseToolkit
+from langchain_core.messages import AIMessage
+from langchain_core.prompts import (
+    ChatPromptTemplate,
+    HumanMessagePromptTemplate,
+    MessagesPlaceholder,
+    SystemMessagePromptTemplate
+)
 from langchain_openai import ChatOpenAI
-from sqlalchemy import create_engine
+from sqlalchemy import MetaData, create_engine
 import os
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
 from dotenv import load_dotenv
 
+from chat_intents import answer as template_answer, normalize_question
+from chat_plans import PLAN_FORMAT, clean_sql, final_sql, format_rows, make_plan, question_shape, run_plan
+from db_cache import DiskCache
+from db_operations import get_data_version, run_read_only_query
+
 load_dotenv()
 
+LLM_MODEL = "gpt-4o-mini"
+
+
+# ------------------------------------------------------------------
+# Answer cache
+# ------------------------------------------------------------------
+# An agent answer takes up to 10 LLM round trips. Answers are cached per
+# normalized question and stamped with the data_version counters of the
+# portfolio tables, so a repeat question is served without the LLM until
+# any process writes to those tables.
+#
+# - CHAT_CACHE_SIZE answers are kept in memory (default 128, LRU, 0 disables)
+# - CHAT_CACHE_PATH=path/to/chat_cache.db also keeps them in a SQLite file
+#   shared by worker processes and across restarts, bounded to
+#   CHAT_CACHE_MAX_MB (default 16)
+
+class AnswerCache:
+    """
+    LRU cache of agent results (answers, SQL plans); an entry is only
+    served while the version it was stored at is still current.
+    """
+
+    def __init__(self, maxsize: int, disk: DiskCache = None):
+        self.maxsize = maxsize
+        self.disk = disk
+        self._entries = OrderedDict()       # key -> (version, response)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, key: str, version: str, response: dict):
+        with self._lock:
+            self._entries[key] = (version, response)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get(self, key: str, version: str):
+        """Return the cached response for key at this version, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+
+        if self.disk is not None:
+            hit, response = self.disk.get(key, version)
+            if hit:
+                self._store(key, version, response)
+                with self._lock:
+                    self.hits += 1
+                return response
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, version: str, response: dict):
+        self._store(key, version, response)
+        if self.disk is not None:
+            self.disk.set(key, version, response)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = {
+                "entries": len(self._entries),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+        if self.disk is not None:
+            stats["disk"] = self.disk.stats()
+        return stats
+
+
+_CHAT_CACHE_SIZE = int(os.getenv("CHAT_CACHE_SIZE", 128))
+
+_chat_disk_cache = (
+    DiskCache(os.getenv("CHAT_CACHE_PATH"), int(float(os.getenv("CHAT_CACHE_MAX_MB", 16)) * 1024 * 1024))
+    if os.getenv("CHAT_CACHE_PATH") else None
+)
+
+answer_cache = AnswerCache(_CHAT_CACHE_SIZE, _chat_disk_cache) if _CHAT_CACHE_SIZE > 0 else None
+
+# SQL plans (chat_plans.py) share the size and file; they are stamped with
+# PLAN_FORMAT instead of the data version, since they re-run on fresh data
+plan_cache = AnswerCache(_CHAT_CACHE_SIZE, _chat_disk_cache) if _CHAT_CACHE_SIZE > 0 else None
+
+
+def _answer_version() -> str:
+    """Data version stamp for cached answers, or None if it can't be read (don't cache)."""
+    versions = get_data_version()
+    if not versions:
+        return None
+    return ",".join(f"{tag}={versions[tag]}" for tag in sorted(versions))
+
+
+# ------------------------------------------------------------------
+# Schema context
+# ------------------------------------------------------------------
+# The agent only needs the three portfolio tables. They are reflected
+# once per process (per database URL) into a one-line-per-table summary
+# with no sample rows, which goes straight into the system prompt. With
+# {table_info} / {table_names} in the prompt, create_sql_agent drops the
+# list-tables and schema tools, so no iterations are spent exploring.
+
+SCHEMA_TABLES = ["investment_category", "portfolio_month", "portfolio_value"]
+
+SQL_AGENT_PREFIX = """You are an agent answering questions about a personal investment portfolio stored in a {dialect} database.
+Write a syntactically correct {dialect} query, run it, then answer from its results.
+Unless the user asks for a specific number of results, return at most {top_k} rows.
+
+Tables: {table_names}. This is their complete schema; do not look for other tables:
+
+{table_info}
+
+- portfolio_value has one amount (in INR) per category per month
+- investment_category.is_active is FALSE for deleted categories
+- Double check the query before executing it. If a query fails, rewrite it and try again.
+- DO NOT make any DML statements (INSERT, UPDATE, DELETE, DROP etc.) to the database.
+- If the question is not about this data, just answer "I don't know".
+
+Give a clear, concise answer with the relevant data."""
+
+SQL_AGENT_SUFFIX = "I already have the schema, so I can write the query directly."
+
+TOP_K = 10
+
+# ------------------------------------------------------------------
+# Single-shot mode
+# ------------------------------------------------------------------
+# CHAT_AGENT_MODE=single_shot answers with one LLM call that writes the
+# SQL; the query runs locally through db_operations.run_read_only_query
+# (single SELECT, read-only transaction, timeout, row cap) and the rows
+# are formatted as a table. CHAT_SINGLE_SHOT_SUMMARY=1 adds one short
+# call that phrases the rows as a sentence. If the model declines or the
+# query fails, the question falls back to the multi-step agent.
+# Default is the agent ("agent"); bench_chat.py compares the two.
+
+CHAT_AGENT_MODE = os.getenv("CHAT_AGENT_MODE", "agent").lower()
+SINGLE_SHOT_SUMMARY = os.getenv("CHAT_SINGLE_SHOT_SUMMARY", "0") == "1"
+SUMMARY_MAX_ROWS = 50
+
+SINGLE_SHOT_PROMPT = """Write one {dialect} SELECT query that answers the user's question about their investment portfolio.
+Unless the user asks for a specific number of results, return at most {top_k} rows.
+
+Tables: {table_names}. This is their complete schema:
+
+{table_info}
+
+- portfolio_value has one amount (in INR) per category per month
+- investment_category.is_active is FALSE for deleted categories
+- Give columns readable aliases.
+
+Reply with the SQL only - no explanation, no markdown. If the question can't be answered from these tables, reply NONE."""
+
+SUMMARY_PROMPT = """Answer the user's question in one or two sentences using only these query results (amounts are in INR):
+
+{results}"""
+
+_schema_databases = {}              # connection string -> SQLDatabase
+_schema_lock = threading.Lock()
+
+
+def _compact_table_info(table, dialect) -> str:
+    """investment_category(category_id INTEGER PK, category_name VARCHAR(100), ...)"""
+    columns = []
+    for column in table.columns:
+        try:
+            column_type = column.type.compile(dialect)
+        except Exception:
+            column_type = str(column.type)
+        details = [column.name, column_type]
+        if column.primary_key:
+            details.append("PK")
+        for foreign_key in column.foreign_keys:
+            details.append(f"-> {foreign_key.target_fullname}")
+        columns.append(" ".join(details))
+    return f"{table.name}({', '.join(columns)})"
+
+
+def _schema_database(connection_string: str) -> SQLDatabase:
+    """SQLDatabase over SCHEMA_TABLES with the compact schema, reflected once per URL."""
+    with _schema_lock:
+        db = _schema_databases.get(connection_string)
+        if db is None:
+            engine = create_engine(connection_string, pool_pre_ping=True)
+            metadata = MetaData()
+            metadata.reflect(bind=engine, only=SCHEMA_TABLES)
+            db = SQLDatabase(
+                engine,
+                metadata=metadata,
+                include_tables=SCHEMA_TABLES,
+                sample_rows_in_table_info=0,
+                custom_table_info={
+                    table.name: _compact_table_info(table, engine.dialect)
+                    for table in metadata.sorted_tables
+                },
+                lazy_table_reflection=True     # already reflected above
+            )
+            _schema_databases[connection_string] = db
+        return db
+
+
+def _sql_agent_prompt() -> ChatPromptTemplate:
+    return ChatPromptTemplate.from_messages([
+        SystemMessagePromptTemplate.from_template(SQL_AGENT_PREFIX),
+        HumanMessagePromptTemplate.from_template("{input}"),
+        AIMessage(content=SQL_AGENT_SUFFIX),
+        MessagesPlaceholder(variable_name="agent_scratchpad"),
+    ])
+
 
 class PortfolioChatAgent:
     """
     Chat agent for interacting with portfolio database using natural language
     """
 
-    def __init__(self, openai_api_key: str):
+    def __init__(self, openai_api_key: str, mode: str = None, llm=None):
         """
         Initialize the chat agent with OpenAI API key
 
         Args:
             openai_api_key: OpenAI API key for LLM
+            mode: "agent" or "single_shot" (default: CHAT_AGENT_MODE)
+            llm: chat model to use instead of ChatOpenAI
+                 (e.g. bench_chat.py's scripted model)
         """
         self.api_key = openai_api_key
-        self.llm = None
+        self.mode = (mode or CHAT_AGENT_MODE).lower()
+        self.llm = llm
         self.agent = None
         self.db = None
 
@@ -61,21 +305,23 @@ class PortfolioChatAgent:
                 f"?sslmode={db_sslmode}"
             )
 
-            # Create SQLAlchemy engine
-            engine = create_engine(connection_string, pool_pre_ping=True)
+            # Embedded SQLite file instead (DB_BACKEND=sqlite, see db_sqlite.py)
+            if os.getenv("DB_BACKEND", "postgres").lower() == "sqlite":
+                connection_string = f"sqlite:///{os.getenv('SQLITE_PATH', 'portfolio.db')}"
 
-            # Create LangChain SQLDatabase wrapper
-            self.db = SQLDatabase(engine)
+            # Portfolio tables only, compact schema, shared by every session
+            self.db = _schema_database(connection_string)
 
             # -------------------------------------------------
             # Initialize LLM
             # -------------------------------------------------
-            self.llm = ChatOpenAI(
-                api_key=self.api_key,
-                model="gpt-4o-mini",
-                temperature=0,
-                streaming=True
-            )
+            if self.llm is None:
+                self.llm = ChatOpenAI(
+                    api_key=self.api_key,
+                    model=LLM_MODEL,
+                    temperature=0,
+                    streaming=True
+                )
 
             # Create SQL toolkit
             toolkit = SQLDatabaseToolkit(db=self.db, llm=self.llm)
@@ -84,6 +330,8 @@ class PortfolioChatAgent:
             self.agent = create_sql_agent(
                 llm=self.llm,
                 toolkit=toolkit,
+                prompt=_sql_agent_prompt(),
+                top_k=TOP_K,
                 agent_type="openai-functions",
                 verbose=True,
                 handle_parsing_errors=True,
@@ -109,6 +357,17 @@ class PortfolioChatAgent:
         Returns:
             dict: Response containing output and any errors
         """
+        # Common questions are answered from templates, without the LLM
+        matched = template_answer(user_question)
+        if matched is not None:
+            intent, output = matched
+            return {
+                "success": True,
+                "output": output,
+                "error": None,
+                "intent": intent
+            }
+
         if not self.agent:
             return {
                 "success": False,
@@ -116,28 +375,52 @@ class PortfolioChatAgent:
                 "error": "Agent not initialized"
             }
 
-        try:
-            enhanced_question = f"""
-            You are querying a portfolio management PostgreSQL database with these tables:
-
-            - investment_category (category_id, category_name, description, is_active)
-            - portfolio_month (month_id, year, month, snapshot_date)
-            - portfolio_value (value_id, month_id, category_id, amount, updated_at)
-
-            User question:
-            {user_question}
+        # Repeat question, data unchanged: answer from the cache
+        cache_key = version = None
+        if answer_cache is not None:
+            cache_key = f"{LLM_MODEL}:{normalize_question(user_question)}"
+            version = _answer_version()
+            if version is not None:
+                cached_response = answer_cache.get(cache_key, version)
+                if cached_response is not None:
+                    return {**cached_response, "cached": True}
 
-            Provide a clear, concise answer with relevant data.
-            """
+        # Same kind of question answered before: re-run its SQL on current data
+        shape = plan_key = None
+        if plan_cache is not None:
+            shape = question_shape(user_question)
+        if shape is not None:
+            plan_key = f"plan:{LLM_MODEL}:{shape[0]}"
+            plan = plan_cache.get(plan_key, PLAN_FORMAT)
+            if plan is not None:
+                output = run_plan(plan, shape[1])
+                if output is not None:
+                    result = {
+                        "success": True,
+                        "output": output,
+                        "error": None
+                    }
+                    if version is not None:
+                        answer_cache.set(cache_key, version, dict(result))
+                    return {**result, "plan": True}
 
-            response = self.agent.invoke({"input": enhanced_question})
-            output = response.get("output", str(response))
+        try:
+            output, sql = self._answer(user_question)
 
-            return {
+            result = {
                 "success": True,
                 "output": output,
                 "error": None
             }
+            if version is not None:
+                answer_cache.set(cache_key, version, dict(result))
+
+            # Keep the SQL for later questions of the same shape
+            if plan_key is not None and sql:
+                plan = make_plan(sql, shape[1])
+                if plan is not None:
+                    plan_cache.set(plan_key, PLAN_FORMAT, plan)
+            return result
 
         except Exception as e:
             return {
@@ -146,6 +429,49 @@ class PortfolioChatAgent:
                 "error": str(e)
             }
 
+    def _answer(self, user_question: str) -> Tuple[str, Optional[str]]:
+        """(answer, SQL it came from) using the configured mode - no caches or templates."""
+        if self.mode == "single_shot":
+            answered = self._single_shot_answer(user_question)
+            if answered is not None:
+                return answered
+        return self._agent_answer(user_question)
+
+    def _agent_answer(self, user_question: str) -> Tuple[str, Optional[str]]:
+        response = self.agent.invoke({"input": user_question})
+        output = response.get("output", str(response))
+        return output, final_sql(response.get("intermediate_steps"))
+
+    def _single_shot_answer(self, user_question: str) -> Optional[Tuple[str, str]]:
+        """One call writes the SQL, it runs locally; None to fall back to the agent."""
+        context = self.db.get_context()
+        prompt = SINGLE_SHOT_PROMPT.format(
+            dialect=self.db.dialect,
+            top_k=TOP_K,
+            table_names=context["table_names"],
+            table_info=context["table_info"]
+        )
+        reply = self.llm.invoke([("system", prompt), ("human", user_question)]).content
+        sql = clean_sql(reply)
+        if sql is None:
+            return None
+
+        # Literal % (LIKE patterns) must survive psycopg2's paramstyle
+        result = run_read_only_query(sql.replace("%", "%%"))
+        if result is None:
+            return None
+        columns, rows = result
+
+        if SINGLE_SHOT_SUMMARY and rows:
+            results = format_rows(columns, rows[:SUMMARY_MAX_ROWS])
+            output = self.llm.invoke([
+                ("system", SUMMARY_PROMPT.format(results=results)),
+                ("human", user_question)
+            ]).content
+        else:
+            output = format_rows(columns, rows)
+        return output, sql
+
     def get_suggested_questions(self) -> list:
         """
         Get a list of suggested questions for users
@@ -0,0 +1,374 @@
+"""
+Template fast path for the AI chatbot
+
+Most chatbot questions (the suggested ones and their rephrasings) ask for
+something db_operations already reads: the latest total, a month's
+breakdown, the category list, the recent trend. answer() recognises those
+intents, pulls the month / year out of phrases like "December 2024",
+"dec 2024" or "2024-12", runs the matching (parameterized, cached)
+db_operations reader and formats the reply locally - no LLM call.
+
+Anything it does not recognise returns None and goes to the SQL agent.
+Matching is deliberately conservative: questions that name a category,
+ask "why" / "should" / "predict"-style questions, or mention a year,
+number, relative period or aggregate the template doesn't use ("in
+2024", "3 months ago", "lowest", "ever") always go to the agent.
+"""
+
+import re
+import unicodedata
+from typing import Dict, List, Optional, Tuple
+
+from db_operations import (
+    get_all_categories,
+    get_all_months,
+    get_dashboard_bundle,
+    get_monthly_summary,
+    get_portfolio_data_stats,
+    get_portfolio_value_history
+)
+
+
+MONTH_NAMES = ['January', 'February', 'March', 'April', 'May', 'June',
+               'July', 'August', 'September', 'October', 'November', 'December']
+
+DEFAULT_TREND_MONTHS = 6
+DEFAULT_GROWTH_MONTHS = 12
+
+_MONTH_WORD = (
+    r"(jan(?:uary)?|feb(?:ruary)?|mar(?:ch)?|apr(?:il)?|may|june?|july?|aug(?:ust)?"
+    r"|sep(?:t(?:ember)?)?|oct(?:ober)?|nov(?:ember)?|dec(?:ember)?)"
+)
+# "december 2024", "dec, 2024", "december of 2024", "2024-12", "12/2024", "december"
+_MONTH_EXPR = re.compile(
+    rf"\b{_MONTH_WORD}\b(?:,?\s+(?:of\s+)?(\d{{4}}))?"
+    r"|\b(\d{4})-(\d{1,2})\b"
+    r"|\b(\d{1,2})/(\d{4})\b"
+)
+_NUMBER_WORDS = {
+    "one": 1, "two": 2, "three": 3, "four": 4, "five": 5, "six": 6,
+    "seven": 7, "eight": 8, "nine": 9, "ten": 10, "eleven": 11, "twelve": 12,
+}
+_LAST_N_MONTHS = re.compile(r"\b(?:last|past|previous)\s+(\d+|" + "|".join(_NUMBER_WORDS) + r")\s+months\b")
+
+# Questions the templates must never try to answer
+_NEEDS_AGENT = re.compile(
+    r"\b(why|should|would|could|predict|forecast|estimate|if|except|excluding|without"
+    r"|per category|by category|each category|percentage|percent|share)\b"
+)
+
+# Periods, numbers and aggregates a template would silently ignore, e.g.
+# "lowest portfolio value" or "portfolio value 3 months ago" must not be
+# answered with the latest total. Years and numbers that name a month (and,
+# for trend / growth, "the last N months") don't count.
+_UNHANDLED = re.compile(
+    r"\d+"
+    r"|\b(?:" + "|".join(_NUMBER_WORDS) + r")\b"
+    r"|\b(?:ago|ever|first|earliest|oldest|since|before|after|until|between|next"
+    r"|last year|this year|previous year|year to date|ytd|quarter|annual|yearly"
+    r"|lowest|highest|min|minimum|max|maximum|average|mean|median|sum|best|worst|peak"
+    r"|most|least|largest|smallest|biggest|top|bottom"
+    r"|may)\b"     # "may" left over by extract_months is the verb: a hypothetical
+)
+# The _UNHANDLED words an intent does implement
+_HANDLED = {
+    "top_category": {"highest", "largest", "biggest", "most", "maximum", "top"},
+    "average": {"average"},
+    "compare": {"between"},
+}
+
+M = "<month>"
+
+
+def normalize_question(question: str) -> str:
+    """Fold case, Unicode forms, whitespace and trailing punctuation."""
+    question = unicodedata.normalize("NFKC", question).casefold()
+    question = re.sub(r"\s+", " ", question).strip()
+    return question.rstrip("?!. ").strip()
+
+
+def extract_months(text: str) -> Tuple[str, List[Tuple[Optional[int], int]]]:
+    """Replace month expressions with <month>; return the text and [(year or None, month)]."""
+    months = []
+
+    def replace(match):
+        word, year, iso_year, iso_month, us_month, us_year = match.groups()
+        if word:
+            month = next(i for i, name in enumerate(MONTH_NAMES, 1) if name.lower().startswith(word[:3]))
+            months.append((int(year) if year else None, month))
+        elif iso_year:
+            months.append((int(iso_year), int(iso_month)))
+        else:
+            months.append((int(us_year), int(us_month)))
+        if not 1 <= months[-1][1] <= 12:
+            months.pop()
+            return match.group(0)
+        return M
+
+    # "may" is also a verb: only treat it as a month after in / for / of or before a year
+    text = re.sub(r"(?<!\bin )(?<!\bfor )(?<!\bof )\bmay\b(?!,?\s+(?:of\s+)?\d{4})", "may_", text)
+    text = _MONTH_EXPR.sub(replace, text).replace("may_", "may")
+    return text, months
+
+
+def resolve_months(months: List[Tuple[Optional[int], int]]) -> List[Tuple[int, int]]:
+    """Fill in a missing year with the latest year that has data for that month."""
+    resolved = []
+    for year, month in months:
+        if year is None:
+            years = [m['year'] for m in get_all_months() if m['month'] == month]
+            year = max(years) if years else None
+        if year is not None:
+            resolved.append((year, month))
+    return resolved
+
+
+def _label(year: int, month: int) -> str:
+    return f"{MONTH_NAMES[month - 1]} {year}"
+
+
+def _money(amount) -> str:
+    return f"₹{float(amount):,.2f}"
+
+
+def _change(current, previous) -> str:
+    current, previous = float(current), float(previous)
+    change = current - previous
+    sign = "+" if change >= 0 else "-"
+    if previous:
+        return f"{sign}{_money(abs(change))} ({sign}{abs(change) / previous * 100:.2f}%)"
+    return f"{sign}{_money(abs(change))}"
+
+
+# ------------------------------------------------------------------
+# Intents
+# ------------------------------------------------------------------
+# Each handler gets the question with month expressions replaced by
+# <month> plus the months found, and returns the answer (or None to hand
+# the question to the agent).
+
+def _total(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if len(months) > 1:
+        return None
+    if months:
+        year, month = months[0]
+        summary = get_monthly_summary(year, month)
+        if not summary:
+            return f"There is no portfolio data for {_label(year, month)}."
+    else:
+        history = get_portfolio_value_history(1)
+        if not history:
+            return "There is no portfolio data yet."
+        summary = history[-1]
+    return (
+        f"Your total portfolio value for {_label(summary['year'], summary['month'])} "
+        f"was **{_money(summary['total_value'])}**."
+    )
+
+
+def _breakdown(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if len(months) > 1:
+        return None
+    bundle = get_dashboard_bundle(*months[0]) if months else get_dashboard_bundle()
+    if not bundle.get('summary'):
+        if months:
+            return f"There is no portfolio data for {_label(*months[0])}."
+        return "There is no portfolio data yet."
+    lines = [
+        f"Your portfolio for {_label(bundle['year'], bundle['month'])}: "
+        f"**{_money(bundle['summary']['total_value'])}** across "
+        f"{bundle['summary']['category_count']} categories.",
+        "",
+        "| Category | Amount |",
+        "|---|---:|",
+    ]
+    for row in sorted(bundle['breakdown'], key=lambda r: float(r['amount']), reverse=True):
+        lines.append(f"| {row['category_name']} | {_money(row['amount'])} |")
+    return "\n".join(lines)
+
+
+def _top_category(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if len(months) > 1:
+        return None
+    bundle = get_dashboard_bundle(*months[0]) if months else get_dashboard_bundle()
+    if not bundle.get('breakdown'):
+        return None
+    top = max(bundle['breakdown'], key=lambda r: float(r['amount']))
+    total = float(bundle['summary']['total_value']) if bundle.get('summary') else 0
+    share = f" ({float(top['amount']) / total * 100:.1f}% of the portfolio)" if total else ""
+    return (
+        f"In {_label(bundle['year'], bundle['month'])} your largest category was "
+        f"**{top['category_name']}** with {_money(top['amount'])}{share}."
+    )
+
+
+def _categories(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if months:
+        return None
+    categories = get_all_categories()
+    if not categories:
+        return "You have no active investment categories yet."
+    lines = [f"You have {len(categories)} active investment categories:", ""]
+    for category in categories:
+        description = f" - {category['description']}" if category.get('description') else ""
+        lines.append(f"- **{category['category_name']}**{description}")
+    return "\n".join(lines)
+
+
+def _months(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if months:
+        return None
+    all_months = get_all_months()
+    if not all_months:
+        return "There is no portfolio data yet."
+    labels = [_label(m['year'], m['month']) for m in all_months]
+    return f"You have portfolio data for {len(labels)} months (latest first):\n\n" + ", ".join(labels)
+
+
+def _average(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if months:
+        return None
+    stats = get_portfolio_data_stats()
+    if not stats or not stats.get('unique_months'):
+        return "There is no portfolio data yet."
+    average = float(stats['total_value']) / stats['unique_months']
+    return (
+        f"Your average portfolio value is **{_money(average)}** per month, "
+        f"over {stats['unique_months']} months of data."
+    )
+
+
+def _history(text: str, default: int) -> List[Dict]:
+    match = _LAST_N_MONTHS.search(text)
+    if match:
+        count = match.group(1)
+        default = int(count) if count.isdigit() else _NUMBER_WORDS[count]
+    return get_portfolio_value_history(max(default, 1))
+
+
+def _trend(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if months:
+        return None
+    history = _history(text, DEFAULT_TREND_MONTHS)
+    if not history:
+        return "There is no portfolio data yet."
+    lines = [
+        f"Your portfolio over the last {len(history)} months:",
+        "",
+        "| Month | Total value | Change |",
+        "|---|---:|---:|",
+    ]
+    previous = None
+    for row in history:
+        change = _change(row['total_value'], previous) if previous is not None else "-"
+        lines.append(f"| {_label(row['year'], row['month'])} | {_money(row['total_value'])} | {change} |")
+        previous = row['total_value']
+    return "\n".join(lines)
+
+
+def _growth(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if months:
+        return None
+    history = _history(text, DEFAULT_GROWTH_MONTHS)
+    if len(history) < 2:
+        return "Growth needs at least two months of portfolio data."
+    first, previous, latest = history[0], history[-2], history[-1]
+    lines = [
+        f"- {_label(latest['year'], latest['month'])} vs {_label(previous['year'], previous['month'])}: "
+        f"{_change(latest['total_value'], previous['total_value'])}",
+        f"- {_label(latest['year'], latest['month'])} vs {_label(first['year'], first['month'])}: "
+        f"{_change(latest['total_value'], first['total_value'])}",
+    ]
+    if float(first['total_value']) > 0:
+        periods = len(history) - 1
+        rate = (float(latest['total_value']) / float(first['total_value'])) ** (1 / periods) - 1
+        lines.append(f"- Average monthly growth rate over {periods} months: {rate * 100:.2f}%")
+    return f"Your portfolio growth (latest value {_money(latest['total_value'])}):\n\n" + "\n".join(lines)
+
+
+def _compare(text: str, months: List[Tuple[int, int]]) -> Optional[str]:
+    if len(months) != 2:
+        return None
+    summaries = []
+    for year, month in months:
+        summary = get_monthly_summary(year, month)
+        if not summary:
+            return f"There is no portfolio data for {_label(year, month)}."
+        summaries.append(summary)
+    earlier, later = sorted(summaries, key=lambda s: (s['year'], s['month']))
+    return (
+        f"- {_label(earlier['year'], earlier['month'])}: {_money(earlier['total_value'])}\n"
+        f"- {_label(later['year'], later['month'])}: {_money(later['total_value'])}\n\n"
+        f"Change: **{_change(later['total_value'], earlier['total_value'])}**"
+    )
+
+
+# (name, pattern over the <month>-substituted question, handler), first match wins
+INTENTS = [
+    ("compare", re.compile(r"\b(compare|comparison|vs|versus|difference between)\b"), _compare),
+    ("top_category", re.compile(
+        r"\bcategor(y|ies)\b.*\b(highest|largest|biggest|most|maximum|top)\b"
+        r"|\b(highest|largest|biggest|top)\s+(investment\s+)?categor(y|ies)\b"
+    ), _top_category),
+    ("categories", re.compile(
+        r"^(show|list|what are|which are|display|give)( me)?( all)?( of)?( my| the)?"
+        r"( all)?( active| current)?( investment)? categor(y|ies)( do i have)?$"
+    ), _categories),
+    ("months", re.compile(
+        r"^(show|list|which|what)( me)?( are)?( all)?( the)? months\b.*\b(data|recorded|snapshots?)$"
+    ), _months),
+    ("average", re.compile(r"\baverage\b.*\b(portfolio|value|total)\b"), _average),
+    ("growth", re.compile(r"\bgrowth\b|\bhow (much )?(has|did) my portfolio gr[oe]w(n)?\b"), _growth),
+    ("trend", re.compile(
+        r"\b(trend|history|historical)\b.*\bportfolio\b|\bportfolio\b.*\b(trend|history)\b"
+        r"|\bportfolio\b.*\bover the (last|past)\b"
+    ), _trend),
+    ("total", re.compile(
+        r"\b(total|overall)\b.*\bportfolio\b|\bportfolio (value|worth|total)\b"
+        r"|\bnet worth\b|\b(total|overall) value of (all )?my investments\b|\bhow much\b.*\bportfolio\b"
+    ), _total),
+    ("breakdown", re.compile(
+        rf"^(show|give|display|what is|what's|what was)?( me)? ?(my )?(the )?"
+        rf"(portfolio|breakdown|allocation|investments?)( breakdown| allocation)?"
+        rf"( for| in| of| as of)?( the)? ({M}|(latest|current|last|most recent) month)$"
+    ), _breakdown),
+]
+
+
+def _unhandled(name: str, text: str) -> bool:
+    """True if text asks for a period or aggregate the intent's template ignores."""
+    text = text.replace("most recent", "latest")
+    if name in ("trend", "growth"):
+        text = _LAST_N_MONTHS.sub("", text)
+    handled = _HANDLED.get(name, set())
+    return any(word not in handled for word in _UNHANDLED.findall(text))
+
+
+def answer(question: str) -> Optional[Tuple[str, str]]:
+    """
+    Answer question from a template if it matches one.
+
+    Returns:
+        (intent name, markdown answer), or None to hand the question to the SQL agent
+    """
+    text = normalize_question(question)
+    if _NEEDS_AGENT.search(text):
+        return None
+    text, months = extract_months(text)
+
+    for name, pattern, handler in INTENTS:
+        if not pattern.search(text):
+            continue
+        if _unhandled(name, text):
+            return None
+        # A category named in the question needs a filter the templates don't have
+        if name not in ("categories", "top_category"):
+            names = {c['category_name'].casefold() for c in get_all_categories()}
+            if any(re.search(rf"\b{re.escape(n)}\b", text) for n in names):
+                return None
+        resolved = resolve_months(months)
+        if len(resolved) != len(months):
+            return None     # a month without a year and no data for it: let the agent explain
+        output = handler(text, resolved)
+        return (name, output) if output is not None else None
+    return None
@@ -0,0 +1,203 @@
+"""
+Saved SQL plans for the AI chatbot
+
+The SQL agent can spend several LLM round trips working out one SELECT.
+Once a question is answered, the final query from the agent's
+intermediate steps is kept as a plan for that *shape* of question, and
+later questions of the same shape re-run it on current data with no LLM
+calls at all.
+
+- question_shape() replaces the literals in a question with placeholders:
+  "portfolio value of coin in december 2024" ->
+  "portfolio value of <category> in <month>" + [category "coin", month (2024, 12)]
+- make_plan() turns the agent's SQL into a parameterized template by
+  finding those literals in it (year = 2024, month = 12, 'coin',
+  LIMIT 6). If any literal can't be located, or the SQL hard-codes a
+  year, date or category the question didn't mention (e.g. "the latest
+  month" resolved to a fixed month while exploring), no plan is made:
+  re-running it would silently answer with stale filters.
+- run_plan() binds the new question's values and runs the template via
+  db_operations.run_read_only_query; the rows are formatted locally.
+"""
+
+import re
+from typing import Dict, List, Optional, Tuple
+
+from chat_intents import extract_months, resolve_months, normalize_question
+from db_operations import get_all_categories, run_read_only_query
+
+
+PLAN_FORMAT = "plan-2"      # bump when the plan layout changes; old entries stop matching
+
+_YEAR = r"\b(?P<year>(?:19|20)\d{2})\b"
+_NUMBER = r"\b(?P<number>\d+)\b"
+_SELECT = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_HARD_CODED_DATE = re.compile(r"\b(19|20)\d{2}\b|'\d{4}-\d{2}(-\d{2})?'")
+_STRING_LITERAL = re.compile(r"'((?:[^']|'')*)'")
+
+
+def question_shape(question: str) -> Optional[Tuple[str, List[Tuple[str, object]]]]:
+    """
+    Returns:
+        (shape, [(kind, value), ...]) in order of appearance,
+        or None if a month can't be resolved to a year
+    """
+    text, months = extract_months(normalize_question(question))
+    resolved = resolve_months(months)
+    if len(resolved) != len(months):
+        return None
+
+    names = {c['category_name'].casefold(): c['category_name'] for c in get_all_categories()}
+    alternatives = [_YEAR, _NUMBER]
+    if names:
+        # Longest names first, so "us stocks" wins over "stocks"
+        category = "|".join(re.escape(name) for name in sorted(names, key=len, reverse=True))
+        alternatives.insert(0, rf"\b(?P<category>{category})\b")
+    literal = re.compile("|".join(alternatives))
+
+    params = []
+    month_values = iter(resolved)
+
+    # One left-to-right pass over each piece, so params keep question order
+    def replace(match):
+        if match.group("category"):
+            params.append(("category", names[match.group("category")]))
+            return "<category>"
+        if match.group("year"):
+            params.append(("year", int(match.group("year"))))
+            return "<year>"
+        params.append(("number", int(match.group("number"))))
+        return "<n>"
+
+    pieces = []
+    for piece in re.split(r"(<month>)", text):
+        if piece == "<month>":
+            params.append(("month", next(month_values)))
+        else:
+            piece = literal.sub(replace, piece)
+        pieces.append(piece)
+    return "".join(pieces), params
+
+
+def _substitute(sql: str, pattern: str, name: str) -> Tuple[str, int]:
+    """Replace the literal captured by group 2 of pattern with %(name)s."""
+    return re.subn(pattern, lambda m: f"{m.group(1)}%({name})s", sql, flags=re.IGNORECASE)
+
+
+def clean_sql(sql: str) -> Optional[str]:
+    """
+    Strip markdown fences and a trailing semicolon from LLM-written SQL.
+
+    Returns:
+        the statement, or None unless it is a single SELECT / WITH query
+    """
+    sql = re.sub(r"^\s*```(?:sql)?|```\s*$", "", sql.strip(), flags=re.IGNORECASE)
+    sql = sql.strip().rstrip(";").strip()
+    if not _SELECT.match(sql) or ";" in sql:
+        return None
+    return sql
+
+
+def make_plan(sql: str, params: List[Tuple[str, object]]) -> Optional[Dict]:
+    """
+    Parameterize the agent's final SQL for the question's params.
+
+    Returns:
+        {"sql": template, "kinds": [kind, ...]}, or None if the SQL can't be reused safely
+    """
+    sql = clean_sql(sql)
+    if sql is None:
+        return None
+    if len({value for _, value in params}) != len(params):
+        return None         # the same literal twice: can't tell which is which
+
+    template = sql.replace("%", "%%")
+    for index, (kind, value) in enumerate(params):
+        name = f"p{index}"
+        if kind == "month":
+            template, year_hits = _substitute(template, rf"(\byear\s*=\s*)({value[0]})\b", f"{name}_year")
+            template, month_hits = _substitute(template, rf"(\bmonth\s*=\s*)({value[1]})\b", f"{name}_month")
+            found = year_hits and month_hits
+        elif kind == "year":
+            template, found = _substitute(template, rf"(\byear\s*=\s*)({value})\b", name)
+        elif kind == "number":
+            template, found = _substitute(template, rf"(\blimit\s+)({value})\b", name)
+        else:
+            # 'coin' or '%%coin%%' (already %-escaped above)
+            template, found = re.subn(
+                rf"'((?:%%)?){re.escape(value)}((?:%%)?)'",
+                lambda m: f"%({name}_{len(m.group(1))}_{len(m.group(2))})s",
+                template,
+                flags=re.IGNORECASE
+            )
+        if not found:
+            return None
+
+    # Anything left that pins a period or a category came from exploring the data
+    literals = [literal.casefold().strip("%") for literal in _STRING_LITERAL.findall(template)]
+    categories = {c['category_name'].casefold() for c in get_all_categories()}
+    if _HARD_CODED_DATE.search(template) or categories.intersection(literals):
+        return None
+
+    return {"sql": template, "kinds": [kind for kind, _ in params]}
+
+
+def _bind(plan: Dict, params: List[Tuple[str, object]]) -> Optional[Dict]:
+    if plan["kinds"] != [kind for kind, _ in params]:
+        return None
+    values = {}
+    for index, (kind, value) in enumerate(params):
+        name = f"p{index}"
+        if kind == "month":
+            values[f"{name}_year"], values[f"{name}_month"] = value
+        elif kind == "category":
+            # Placeholders look like p0_0_0 / p0_2_2 (width of the %% wrapped around the name)
+            for placeholder in re.findall(rf"%\(({name}_\d_\d)\)s", plan["sql"]):
+                _, prefix, suffix = placeholder.split("_")
+                values[placeholder] = ("%" if prefix != "0" else "") + value + ("%" if suffix != "0" else "")
+        else:
+            values[name] = value
+    return values
+
+
+def format_rows(columns: List[str], rows: List[tuple]) -> str:
+    """Query results as a markdown table (or one bold value)."""
+    if not rows:
+        return "No matching data found."
+    if len(rows) == 1 and len(columns) == 1:
+        return f"**{columns[0]}**: {rows[0][0]}"
+    lines = [
+        "| " + " | ".join(columns) + " |",
+        "|" + "---|" * len(columns),
+    ]
+    for row in rows:
+        lines.append("| " + " | ".join("" if value is None else str(value) for value in row) + " |")
+    return "\n".join(lines)
+
+
+def run_plan(plan: Dict, params: List[Tuple[str, object]]) -> Optional[str]:
+    """Re-run a saved plan with this question's values; None if it doesn't fit or fails."""
+    values = _bind(plan, params)
+    if values is None:
+        return None
+    result = run_read_only_query(plan["sql"], values)
+    if result is None:
+        return None
+    columns, rows = result
+    return format_rows(columns, rows)
+
+
+def final_sql(intermediate_steps) -> Optional[str]:
+    """
+    The agent's SQL from return_intermediate_steps, if it ran exactly one
+    successful query (answers combining several queries aren't reusable).
+    """
+    queries = []
+    for action, observation in intermediate_steps or []:
+        if getattr(action, "tool", None) != "sql_db_query":
+            continue
+        tool_input = action.tool_input
+        query = tool_input.get("query") if isinstance(tool_input, dict) else tool_input
+        if query and not str(observation).startswith("Error"):
+            queries.append(query)
+    return queries[0] if len(queries) == 1 else None
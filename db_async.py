@@ -0,0 +1,637 @@
+"""
+Async database operations for portfolio management
+(PostgreSQL / Neon via asyncpg)
+
+Async counterparts of the db_operations readers and writers, with the
+same names, arguments and return shapes, so independent queries can
+overlap instead of queueing on one blocking connection:
+
+    summary, history = await asyncio.gather(
+        get_monthly_summary(2024, 12),
+        get_portfolio_value_history(6),
+    )
+
+- connections come from an asyncpg pool (one per event loop, sized by
+  the same DB_POOL_* variables as the sync pool)
+- readers share the db_cache cache and its tags with db_operations, and
+  writers invalidate them, so sync and async callers see the same data
+- the SQL is db_operations' own statements; only the driver calls differ
+- every function is @instrumented and shows up in db_metrics as
+  "<name> (async)"
+- with DB_BACKEND=sqlite there is no async driver: each function runs
+  its db_operations twin in a worker thread instead
+
+Synchronous code (e.g. Streamlit) can drive these with run_sync().
+"""
+
+import asyncio
+import functools
+import os
+import re
+import ssl
+import threading
+import time
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+from asyncpg.exceptions import UndefinedTableError
+from dotenv import load_dotenv
+
+import db_operations
+from db_cache import cached, invalidates
+from db_config import DB_BACKEND
+from db_metrics import instrumented, record_connect, record_query
+from db_operations import (
+    DATA_VERSION_TAGS,
+    _ADD_CATEGORY,
+    _ALL_CATEGORIES,
+    _ALL_MONTHS,
+    _CREATE_MONTH,
+    _DASHBOARD_BUNDLE,
+    _DATA_VERSION,
+    _DELETE_CATEGORY,
+    _MONTH_ID,
+    _MONTH_TOTALS,
+    _MONTH_TOTALS_FALLBACK,
+    _MONTHLY_SUMMARY,
+    _PORTFOLIO_DATA_AFTER,
+    _PORTFOLIO_DATA_ORDER,
+    _PORTFOLIO_DATA_SELECT,
+    _PORTFOLIO_DATA_STATS,
+    _SAVE_MONTH_SNAPSHOT,
+    _SAVE_VALUE,
+    _VALUE_HISTORY,
+    _portfolio_data_filters,
+    _portfolio_value_error,
+    _snapshot_results,
+    _split_dashboard_bundle
+)
+
+load_dotenv()
+
+
+# =====================================================
+# CONNECTION POOL
+# =====================================================
+
+_pools = {}     # event loop -> future of its asyncpg pool (pools are bound to their loop)
+
+
+def _ssl_mode():
+    # asyncpg takes libpq-style mode names; "disable" must be passed as False
+    mode = os.getenv("DB_SSLMODE", "require")
+    return False if mode == "disable" else mode
+
+
+async def get_async_pool() -> asyncpg.Pool:
+    """
+    Return the asyncpg pool for the running event loop, creating it on first use.
+
+    Uses the sync pool's settings: DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE and
+    DB_POOL_MAX_IDLE (seconds before an idle connection is closed).
+    """
+    loop = asyncio.get_running_loop()
+    future = _pools.get(loop)
+    if future is None:
+        future = _pools[loop] = asyncio.ensure_future(asyncpg.create_pool(
+            host=os.getenv("DB_HOST"),
+            port=int(os.getenv("DB_PORT", 5432)),
+            database=os.getenv("DB_NAME"),
+            user=os.getenv("DB_USER"),
+            password=os.getenv("DB_PASSWORD"),
+            ssl=_ssl_mode(),
+            min_size=int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+            max_size=int(os.getenv("DB_POOL_MAX_SIZE", 5)),
+            max_inactive_connection_lifetime=float(os.getenv("DB_POOL_MAX_IDLE", 300))
+        ))
+    try:
+        return await asyncio.shield(future)
+    except Exception:
+        # Let the next call retry instead of caching the failure
+        if _pools.get(loop) is future:
+            del _pools[loop]
+        raise
+
+
+async def close_async_pool():
+    """Close the running event loop's pool (e.g. on API server shutdown)."""
+    future = _pools.pop(asyncio.get_running_loop(), None)
+    if future is not None:
+        try:
+            pool = await future
+        except Exception:
+            return
+        await pool.close()
+
+
+@asynccontextmanager
+async def async_db_connection():
+    """
+    Async counterpart of db_config.db_connection(): yields a pooled
+    asyncpg connection, or None when the database is unreachable.
+    """
+    start = time.perf_counter()
+    pool = None
+    connection = None
+    try:
+        pool = await get_async_pool()
+        connection = await pool.acquire(timeout=float(os.getenv("DB_POOL_TIMEOUT", 30)))
+    except (OSError, asyncpg.PostgresError, asyncio.TimeoutError, ssl.SSLError) as e:
+        print(f"Error connecting to PostgreSQL (Neon): {e}")
+    finally:
+        record_connect((time.perf_counter() - start) * 1000)
+
+    try:
+        yield connection
+    finally:
+        if connection is not None:
+            await pool.release(connection)
+
+
+# =====================================================
+# Statement helpers
+# =====================================================
+
+# The statements are db_operations' psycopg2-style SQL; each one is
+# rewritten for asyncpg once and then served from _numbered's cache.
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+
+
+@functools.lru_cache(maxsize=256)
+def _numbered(query: str) -> Tuple[str, Tuple[str, ...]]:
+    """
+    Rewrite psycopg2 placeholders as asyncpg's $1, $2, ...
+
+    Returns:
+        (query, names): names lists the %(name)s parameters in $n order
+        (empty for %s queries, whose params are already positional)
+    """
+    names = []
+    counter = 0
+
+    def replace(match):
+        nonlocal counter
+        if match.group(0) == "%%":
+            return "%"
+        name = match.group(1)
+        if name is None:
+            counter += 1
+            return f"${counter}"
+        # A name used twice binds the same $n
+        if name not in names:
+            names.append(name)
+        return f"${names.index(name) + 1}"
+
+    return _PLACEHOLDER.sub(replace, query), tuple(names)
+
+
+# Translate the fixed statements at import; the filtered
+# get_portfolio_data* variants are cached on first use
+for _statement in (_ADD_CATEGORY, _ALL_CATEGORIES, _ALL_MONTHS, _CREATE_MONTH, _DATA_VERSION,
+                   _DELETE_CATEGORY, _MONTH_ID, _SAVE_MONTH_SNAPSHOT, _SAVE_VALUE):
+    _numbered(_statement)
+for _statement in (_DASHBOARD_BUNDLE, _MONTHLY_SUMMARY, _VALUE_HISTORY):
+    _numbered(_statement.format(month_totals=_MONTH_TOTALS))
+
+
+def _args(names: Tuple[str, ...], params) -> tuple:
+    return tuple(params[name] for name in names) if names else tuple(params)
+
+
+async def _fetch(connection, query: str, params=()) -> List[Dict]:
+    start = time.perf_counter()
+    rows = []
+    try:
+        numbered, names = _numbered(query)
+        rows = await connection.fetch(numbered, *_args(names, params))
+        return [dict(row) for row in rows]
+    finally:
+        record_query((time.perf_counter() - start) * 1000, len(rows), query, params)
+
+
+async def _fetchrow(connection, query: str, params=()) -> Optional[Dict]:
+    rows = await _fetch(connection, query, params)
+    return rows[0] if rows else None
+
+
+async def _execute(connection, query: str, params=()) -> str:
+    start = time.perf_counter()
+    try:
+        numbered, names = _numbered(query)
+        return await connection.execute(numbered, *_args(names, params))
+    finally:
+        record_query((time.perf_counter() - start) * 1000, 0, query, params)
+
+
+async def _fetch_month_totals(connection, query: str, params) -> List[Dict]:
+    """_fetch a query that joins {month_totals}, falling back if the rollup is missing."""
+    try:
+        return await _fetch(connection, query.format(month_totals=_MONTH_TOTALS), params)
+    except UndefinedTableError:
+        return await _fetch(connection, query.format(month_totals=_MONTH_TOTALS_FALLBACK), params)
+
+
+def _embedded(sync_func):
+    """On the SQLite backend, run the db_operations twin in a worker thread instead."""
+    def decorator(func):
+        if DB_BACKEND != "sqlite":
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            return await asyncio.to_thread(sync_func, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ------------------------------------------------------------------
+# Data version
+# ------------------------------------------------------------------
+
+@_embedded(db_operations.get_data_version)
+@instrumented
+async def get_data_version() -> Dict[str, int]:
+    """Per-tag write counters from data_version (see db_operations.get_data_version)."""
+    async with async_db_connection() as connection:
+        if not connection:
+            return {}
+
+        try:
+            rows = await _fetch(connection, _DATA_VERSION)
+            return {
+                DATA_VERSION_TAGS[row["table_name"]]: row["version"]
+                for row in rows
+                if row["table_name"] in DATA_VERSION_TAGS
+            }
+        except Exception as e:
+            print(f"Error fetching data version: {e}")
+            return {}
+
+
+# ------------------------------------------------------------------
+# Categories
+# ------------------------------------------------------------------
+
+@_embedded(db_operations.get_all_categories)
+@instrumented
+@cached("categories")
+async def get_all_categories() -> List[Dict]:
+    async with async_db_connection() as connection:
+        if not connection:
+            return []
+
+        try:
+            return await _fetch(connection, _ALL_CATEGORIES)
+        except Exception as e:
+            print(f"Error fetching categories: {e}")
+            return []
+
+
+@_embedded(db_operations.add_category)
+@instrumented
+@invalidates("categories")
+async def add_category(category_name: str, description: str = "") -> Tuple[bool, str]:
+    async with async_db_connection() as connection:
+        if not connection:
+            return False, "Database connection failed"
+
+        try:
+            await _execute(connection, _ADD_CATEGORY, (category_name, description))
+            return True, "Category added successfully"
+        except Exception as e:
+            if "unique" in str(e).lower():
+                return False, f"Category '{category_name}' already exists"
+            return False, f"Error adding category: {e}"
+
+
+@_embedded(db_operations.delete_category)
+@instrumented
+@invalidates("categories")
+async def delete_category(category_id: int) -> Tuple[bool, str]:
+    async with async_db_connection() as connection:
+        if not connection:
+            return False, "Database connection failed"
+
+        try:
+            await _execute(connection, _DELETE_CATEGORY, (category_id,))
+            return True, "Category deleted successfully"
+        except Exception as e:
+            return False, f"Error deleting category: {e}"
+
+
+# ------------------------------------------------------------------
+# Months
+# ------------------------------------------------------------------
+
+@_embedded(db_operations.get_or_create_month)
+@instrumented
+@invalidates("months")
+async def get_or_create_month(year: int, month: int, snapshot_date: date) -> Optional[int]:
+    async with async_db_connection() as connection:
+        if not connection:
+            return None
+
+        try:
+            async with connection.transaction():
+                row = await _fetchrow(connection, _MONTH_ID, (year, month))
+                if row:
+                    return row["month_id"]
+
+                row = await _fetchrow(connection, _CREATE_MONTH, (year, month, snapshot_date))
+                return row["month_id"]
+        except Exception as e:
+            print(f"Error getting/creating month: {e}")
+            return None
+
+
+@_embedded(db_operations.get_all_months)
+@instrumented
+@cached("months")
+async def get_all_months() -> List[Dict]:
+    async with async_db_connection() as connection:
+        if not connection:
+            return []
+
+        try:
+            return await _fetch(connection, _ALL_MONTHS)
+        except Exception as e:
+            print(f"Error fetching months: {e}")
+            return []
+
+
+# ------------------------------------------------------------------
+# Portfolio Values
+# ------------------------------------------------------------------
+
+@_embedded(db_operations.save_portfolio_value)
+@instrumented
+@invalidates("values")
+async def save_portfolio_value(
+    month_id: int,
+    category_id: int,
+    amount: float
+) -> Tuple[bool, str]:
+    async with async_db_connection() as connection:
+        if not connection:
+            return False, "Database connection failed"
+
+        try:
+            await _execute(connection, _SAVE_VALUE, (month_id, category_id, amount))
+            return True, "Portfolio value saved successfully"
+        except Exception as e:
+            return False, _portfolio_value_error(e)
+
+
+@_embedded(db_operations.save_portfolio_values)
+@instrumented
+@invalidates("values")
+async def save_portfolio_values(
+    month_id: int,
+    amounts: Dict[int, float]
+) -> Dict[int, Tuple[bool, str]]:
+    """
+    Save a whole month of portfolio values in one transaction.
+
+    asyncpg's executemany pipelines every row in one round trip and is
+    atomic. If it fails, the rows are retried one by one behind
+    savepoints so only the bad ones are reported.
+    """
+    if not amounts:
+        return {}
+
+    async with async_db_connection() as connection:
+        if not connection:
+            return {category_id: (False, "Database connection failed") for category_id in amounts}
+
+        rows = [(month_id, category_id, amount) for category_id, amount in amounts.items()]
+        try:
+            start = time.perf_counter()
+            try:
+                await connection.executemany(_numbered(_SAVE_VALUE)[0], rows)
+                return {category_id: (True, "Portfolio value saved successfully") for category_id in amounts}
+            except Exception:
+                pass
+            finally:
+                record_query((time.perf_counter() - start) * 1000, 0, _SAVE_VALUE, rows)
+
+            # Batch failed - isolate the failing rows with one savepoint per row
+            results = {}
+            async with connection.transaction():
+                for row in rows:
+                    try:
+                        async with connection.transaction():
+                            await _execute(connection, _SAVE_VALUE, row)
+                        results[row[1]] = (True, "Portfolio value saved successfully")
+                    except Exception as e:
+                        results[row[1]] = (False, _portfolio_value_error(e))
+            return results
+        except Exception as e:
+            message = _portfolio_value_error(e)
+            return {category_id: (False, message) for category_id in amounts}
+
+
+@_embedded(db_operations.save_month_snapshot)
+@instrumented
+@invalidates("months", "values")
+async def save_month_snapshot(
+    year: int,
+    month: int,
+    snapshot_date: date,
+    amounts: Dict[int, float]
+) -> Tuple[Optional[int], Dict[int, Tuple[bool, str]]]:
+    """Create (or look up) a month and upsert all of its values in one statement."""
+    async with async_db_connection() as connection:
+        if not connection:
+            return None, {category_id: (False, "Database connection failed") for category_id in amounts}
+
+        try:
+            category_ids = list(amounts.keys())
+            row = await _fetchrow(connection, _SAVE_MONTH_SNAPSHOT, (
+                year, month, snapshot_date,
+                category_ids, [amounts[category_id] for category_id in category_ids]
+            ))
+            return row["month_id"], _snapshot_results(amounts, set(row["saved"]))
+
+        except Exception as e:
+            print(f"Error saving month snapshot: {e}")
+            message = _portfolio_value_error(e)
+            return None, {category_id: (False, message) for category_id in amounts}
+
+
+@_embedded(db_operations.get_portfolio_data)
+@instrumented
+async def get_portfolio_data(
+    year: Optional[int] = None,
+    month: Optional[int] = None
+) -> List[Dict]:
+    async with async_db_connection() as connection:
+        if not connection:
+            return []
+
+        try:
+            clause, params = _portfolio_data_filters(year, month)
+            query = _PORTFOLIO_DATA_SELECT + clause + _PORTFOLIO_DATA_ORDER
+            return await _fetch(connection, query, params)
+        except Exception as e:
+            print(f"Error fetching portfolio data: {e}")
+            return []
+
+
+@_embedded(db_operations.get_portfolio_data_page)
+@instrumented
+async def get_portfolio_data_page(
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    after: Optional[Tuple[int, int, str]] = None,
+    limit: int = 100
+) -> Tuple[List[Dict], Optional[Tuple[int, int, str]]]:
+    """One keyset-paginated page of get_portfolio_data (see db_operations)."""
+    async with async_db_connection() as connection:
+        if not connection:
+            return [], None
+
+        try:
+            clause, params = _portfolio_data_filters(year, month)
+            query = _PORTFOLIO_DATA_SELECT + clause
+
+            if after is not None:
+                after_year, after_month, after_category = after
+                query += _PORTFOLIO_DATA_AFTER
+                params += [after_year, after_month, after_year, after_month, after_category]
+
+            query += _PORTFOLIO_DATA_ORDER + " LIMIT %s"
+            params.append(limit + 1)
+
+            rows = await _fetch(connection, query, params)
+            if len(rows) <= limit:
+                return rows, None
+            rows = rows[:limit]
+            last = rows[-1]
+            return rows, (last["year"], last["month"], last["category_name"])
+        except Exception as e:
+            print(f"Error fetching portfolio data page: {e}")
+            return [], None
+
+
+@_embedded(db_operations.get_portfolio_data_stats)
+@instrumented
+@cached("months", "values")
+async def get_portfolio_data_stats(
+    year: Optional[int] = None,
+    month: Optional[int] = None
+) -> Dict:
+    async with async_db_connection() as connection:
+        if not connection:
+            return {}
+
+        try:
+            clause, params = _portfolio_data_filters(year, month)
+            row = await _fetchrow(connection, _PORTFOLIO_DATA_STATS + clause, params)
+            return row if row else {}
+        except Exception as e:
+            print(f"Error fetching portfolio data stats: {e}")
+            return {}
+
+
+@_embedded(db_operations.get_monthly_summary)
+@instrumented
+@cached("months", "values")
+async def get_monthly_summary(year: int, month: int) -> Dict:
+    async with async_db_connection() as connection:
+        if not connection:
+            return {}
+
+        try:
+            rows = await _fetch_month_totals(connection, _MONTHLY_SUMMARY, (year, month))
+            return rows[0] if rows else {}
+        except Exception as e:
+            print(f"Error fetching monthly summary: {e}")
+            return {}
+
+
+@_embedded(db_operations.get_portfolio_value_history)
+@instrumented
+@cached("months", "values")
+async def get_portfolio_value_history(num_months: int = 6) -> List[Dict]:
+    """Most recent num_months monthly totals, oldest first (for chart display)."""
+    async with async_db_connection() as connection:
+        if not connection:
+            return []
+
+        try:
+            rows = await _fetch_month_totals(connection, _VALUE_HISTORY, (num_months,))
+            return list(reversed(rows))
+        except Exception as e:
+            print(f"Error fetching portfolio value history: {e}")
+            return []
+
+
+# ------------------------------------------------------------------
+# Dashboard
+# ------------------------------------------------------------------
+
+@_embedded(db_operations.get_dashboard_bundle)
+@instrumented
+@cached("categories", "months", "values")
+async def get_dashboard_bundle(
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    num_months: int = 6
+) -> Dict:
+    """Everything show_dashboard needs in one round trip (see db_operations)."""
+    async with async_db_connection() as connection:
+        if not connection:
+            return {}
+
+        try:
+            rows = await _fetch_month_totals(
+                connection, _DASHBOARD_BUNDLE, {"year": year, "month": month, "num_months": num_months}
+            )
+            return _split_dashboard_bundle(rows)
+        except Exception as e:
+            print(f"Error fetching dashboard bundle: {e}")
+            return {}
+
+
+async def get_dashboard_data(year: int, month: int, num_months: int = 6) -> Dict:
+    """
+    show_dashboard's summary, history and breakdown, fetched concurrently
+    on separate pooled connections.
+
+    Returns:
+        {"summary": get_monthly_summary, "history": get_portfolio_value_history,
+         "breakdown": get_portfolio_data(year, month)}
+    """
+    summary, history, breakdown = await asyncio.gather(
+        get_monthly_summary(year, month),
+        get_portfolio_value_history(num_months),
+        get_portfolio_data(year, month)
+    )
+    return {"summary": summary, "history": history, "breakdown": breakdown}
+
+
+# =====================================================
+# Calling from synchronous code
+# =====================================================
+# Streamlit scripts are synchronous. asyncio.run() would create (and
+# tear down) a new loop - and therefore a new pool - on every rerun, so
+# sync callers share one long-lived loop on a daemon thread instead.
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def run_sync(coroutine, timeout: Optional[float] = None):
+    """
+    Run a db_async coroutine from synchronous code and return its result:
+
+        data = run_sync(get_dashboard_data(2024, 12))
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="db_async", daemon=True).start()
+    return asyncio.run_coroutine_threadsafe(coroutine, _loop).result(timeout)
@@ -0,0 +1,348 @@
+"""
+Read-through cache for db_operations readers
+
+Streamlit re-runs the whole script on every interaction (even the
+privacy eye toggle), so without a cache every rerun goes back to Neon.
+
+- Readers are wrapped with @cached("tag", ...) and served from memory
+- Writers are wrapped with @invalidates("tag", ...) and drop every
+  entry carrying one of those tags once they return
+- Entries expire after DB_CACHE_TTL seconds (default 300, 0 disables)
+- At most DB_CACHE_MAXSIZE entries are kept (default 256, LRU eviction)
+
+Optional second tier (DB_DISK_CACHE_PATH=path/to/cache.db): a SQLite file
+shared by every worker process on the host and kept across restarts.
+Its entries are keyed by the data_version counters of their tags, so a
+memory miss costs one tiny version lookup instead of the full query, and
+an entry is simply never matched again once its tables change. The file
+is bounded to DB_DISK_CACHE_MAX_MB (default 64) with LRU eviction.
+
+Tags used by db_operations:
+- "categories": investment_category
+- "months":     portfolio_month
+- "values":     portfolio_value
+"""
+
+import asyncio
+import copy
+import functools
+import inspect
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class TTLCache:
+    """
+    Thread-safe LRU cache whose entries expire after ttl seconds
+    and can be invalidated by tag.
+    """
+
+    def __init__(self, maxsize: int = 256, ttl: float = 300.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()   # key -> (expires_at, tags, value)
+        self._generations = {}          # tag -> number of invalidations so far
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Return (True, value) on a fresh hit, (False, None) otherwise."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, _, value = entry
+                if time.monotonic() < expires_at:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+                del self._entries[key]
+            self.misses += 1
+            return False, None
+
+    def generation(self, tags) -> tuple:
+        """Snapshot of the invalidation counters for the given tags."""
+        with self._lock:
+            return tuple(self._generations.get(tag, 0) for tag in tags)
+
+    def set(self, key, value, tags=(), generation=None):
+        """
+        Store a value. If generation (from generation(tags), taken before the
+        read) no longer matches, a write happened mid-read and the value is
+        dropped instead of caching a possibly stale result.
+        """
+        if self.ttl <= 0 or self.maxsize <= 0:
+            return
+        with self._lock:
+            if generation is not None and generation != tuple(self._generations.get(tag, 0) for tag in tags):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, frozenset(tags), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, *tags):
+        """Drop every entry tagged with any of the given tags."""
+        tags = set(tags)
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+            stale = [key for key, (_, entry_tags, _) in self._entries.items() if entry_tags & tags]
+            for key in stale:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+
+class DiskCache:
+    """
+    Size-bounded LRU cache in a SQLite file, shared between processes.
+
+    Each key holds one entry stamped with the version it was read at;
+    get() only returns it while the caller's version still matches.
+    Errors (locked / corrupt file) are reported and treated as misses.
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()     # sqlite3 connections are per thread
+        self.hits = 0
+        self.misses = 0
+
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")     # a lost entry is only a miss
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS cache_entry (
+                    key TEXT PRIMARY KEY,
+                    version TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_cache_entry_last_used ON cache_entry (last_used)")
+            self._local.connection = connection
+        return connection
+
+    def get(self, key: str, version: str):
+        """Return (True, value) if key was cached at this version, (False, None) otherwise."""
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT value FROM cache_entry WHERE key = ? AND version = ?", (key, version)
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return False, None
+            connection.execute("UPDATE cache_entry SET last_used = ? WHERE key = ?", (time.time(), key))
+            self.hits += 1
+            return True, pickle.loads(row[0])
+        except (sqlite3.Error, pickle.UnpicklingError, EOFError) as e:
+            print(f"Disk cache read error: {e}")
+            return False, None
+
+    def set(self, key: str, version: str, value):
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+            if len(blob) > self.max_bytes:
+                return
+            connection = self._connection()
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                connection.execute(
+                    "INSERT OR REPLACE INTO cache_entry (key, version, value, size, last_used) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, version, blob, len(blob), time.time())
+                )
+                # Evict least recently used entries until the file is back under budget
+                total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM cache_entry").fetchone()[0]
+                while total > self.max_bytes:
+                    oldest = connection.execute(
+                        "SELECT key, size FROM cache_entry ORDER BY last_used LIMIT 1"
+                    ).fetchone()
+                    connection.execute("DELETE FROM cache_entry WHERE key = ?", (oldest[0],))
+                    total -= oldest[1]
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+        except (sqlite3.Error, pickle.PicklingError) as e:
+            print(f"Disk cache write error: {e}")
+
+    def clear(self):
+        try:
+            self._connection().execute("DELETE FROM cache_entry")
+        except sqlite3.Error as e:
+            print(f"Disk cache clear error: {e}")
+
+    def stats(self) -> dict:
+        try:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entry"
+            ).fetchone()
+        except sqlite3.Error:
+            entries, size = 0, 0
+        return {
+            "path": self.path,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+cache = TTLCache(
+    maxsize=int(os.getenv("DB_CACHE_MAXSIZE", 256)),
+    ttl=float(os.getenv("DB_CACHE_TTL", 300))
+)
+
+disk_cache = (
+    DiskCache(os.getenv("DB_DISK_CACHE_PATH"), int(float(os.getenv("DB_DISK_CACHE_MAX_MB", 64)) * 1024 * 1024))
+    if os.getenv("DB_DISK_CACHE_PATH") else None
+)
+
+# Returns {tag: counter} (db_operations registers get_data_version)
+_version_source = None
+
+
+def set_version_source(func):
+    """Register the function the disk tier uses to read the current data version."""
+    global _version_source
+    _version_source = func
+
+
+def _disk_version(tags) -> str:
+    """Version stamp for an entry with these tags, or None if it can't be determined."""
+    if disk_cache is None or _version_source is None:
+        return None
+    versions = _version_source()
+    if not all(tag in versions for tag in tags):
+        return None
+    return ",".join(f"{tag}={versions[tag]}" for tag in sorted(tags))
+
+
+def _disk_lookup(key, tags):
+    """Second tier, after a memory miss: (hit, value, version to store a fresh read under)."""
+    version = _disk_version(tags)
+    if version is None:
+        return False, None, None
+    hit, value = disk_cache.get(repr(key), version)
+    return hit, value, version
+
+
+def cached(*tags):
+    """
+    Serve a reader from the cache, keyed on its name and arguments.
+
+    Empty results are not cached: readers return [] / {} on database
+    errors too, and a transient failure must not stick for a whole TTL.
+    Callers get a shallow copy, so mutating the returned list/dict
+    does not corrupt the cached entry. Works on async readers too.
+    A memory miss tries the disk tier (if configured) before the database.
+    """
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                key = (func.__module__, func.__name__, args, tuple(sorted(kwargs.items())))
+                hit, value = cache.get(key)
+                if not hit:
+                    generation = cache.generation(tags)
+                    version = None
+                    if disk_cache is not None:
+                        # The version lookup and the file both block - keep them off the loop
+                        hit, value, version = await asyncio.to_thread(_disk_lookup, key, tags)
+                    if not hit:
+                        value = await func(*args, **kwargs)
+                        if not value:
+                            return value
+                        if version is not None:
+                            await asyncio.to_thread(disk_cache.set, repr(key), version, value)
+                    cache.set(key, value, tags, generation)
+                return copy.copy(value)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = (func.__module__, func.__name__, args, tuple(sorted(kwargs.items())))
+            hit, value = cache.get(key)
+            if not hit:
+                generation = cache.generation(tags)
+                hit, value, version = _disk_lookup(key, tags)
+                if not hit:
+                    value = func(*args, **kwargs)
+                    if not value:
+                        return value
+                    if version is not None:
+                        disk_cache.set(repr(key), version, value)
+                cache.set(key, value, tags, generation)
+            return copy.copy(value)
+        return wrapper
+    return decorator
+
+
+def invalidates(*tags):
+    """Invalidate the given tags after a writer returns (or raises)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    cache.invalidate(*tags)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                return func(*args, **kwargs)
+            finally:
+                cache.invalidate(*tags)
+        return wrapper
+    return decorator
+
+
+def data_token(*tags) -> tuple:
+    """
+    Changes whenever a writer in this process - or, with db_notify's
+    listener running, in any process - invalidates one of the tags
+    (all three by default). Costs no database work, so UI caches such as
+    st.cache_data can key on it.
+    """
+    return cache.generation(tags or ("categories", "months", "values"))
+
+
+def clear_cache():
+    """Drop every cached read (e.g. after editing the database by hand)."""
+    cache.clear()
+    if disk_cache is not None:
+        disk_cache.clear()
@@ -7,9 +7,15 @@ It is now migrated to PostgreSQL (Neon – free tier).
 ⚠ IMPORTANT:
 - MySQL code is KEPT for reference / fallback
 - PostgreSQL (Neon) is the ACTIVE connection
+- DB_BACKEND=sqlite switches to an embedded SQLite file (see db_sqlite.py)
 """
 
 import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 # --- MySQL imports (KEPT for reference) ---
@@ -19,69 +25,386 @@ from dotenv import load_dotenv
 # --- PostgreSQL imports (ACTIVE) ---
 import psycopg2
 from psycopg2 import Error as PostgresError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+from db_metrics import InstrumentedConnection, record_connect
+from db_sqlite import connect_sqlite
 
 # Load environment variables from .env
 load_dotenv()
 
+# "postgres" (Neon, default) or "sqlite" (embedded, zero network latency)
+DB_BACKEND = os.getenv("DB_BACKEND", "postgres").lower()
 
-def get_db_connection():
+
+def create_connection():
     """
-    Create and return a database connection.
+    Open a brand-new (unpooled) database connection.
+
+    Most code should borrow one with db_connection() instead; this is for
+    the pool itself and for long-lived sessions such as db_notify's LISTEN.
 
     CURRENT ACTIVE DB:
-    - PostgreSQL (Neon)
+    - PostgreSQL (Neon), or SQLite when DB_BACKEND=sqlite
 
     To switch back to MySQL:
     - Comment Postgres section
     - Uncomment MySQL section
     """
-    try:
-        # =====================================================
-        # MySQL CONNECTION (LOCAL / RAILWAY) - DISABLED
-        # =====================================================
-        """
-        connection = mysql.connector.connect(
-            host=os.getenv("DB_HOST", "localhost"),
-            port=int(os.getenv("DB_PORT", 3306)),
-            database=os.getenv("DB_NAME", "portfolio"),
-            user=os.getenv("DB_USER", "root"),
-            password=os.getenv("DB_PASSWORD", "")
-        )
+    # =====================================================
+    # SQLITE CONNECTION (EMBEDDED) - DB_BACKEND=sqlite
+    # =====================================================
+    if DB_BACKEND == "sqlite":
+        return connect_sqlite(os.getenv("SQLITE_PATH", "portfolio.db"))
+
+    # =====================================================
+    # MySQL CONNECTION (LOCAL / RAILWAY) - DISABLED
+    # =====================================================
+    """
+    connection = mysql.connector.connect(
+        host=os.getenv("DB_HOST", "localhost"),
+        port=int(os.getenv("DB_PORT", 3306)),
+        database=os.getenv("DB_NAME", "portfolio"),
+        user=os.getenv("DB_USER", "root"),
+        password=os.getenv("DB_PASSWORD", "")
+    )
+
+    if connection.is_connected():
+        return connection
+    """
+
+    # =====================================================
+    # POSTGRESQL CONNECTION (NEON) - ACTIVE
+    # =====================================================
+    connection = psycopg2.connect(
+        host=os.getenv("DB_HOST"),
+        port=int(os.getenv("DB_PORT", 5432)),
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        sslmode=os.getenv("DB_SSLMODE", "require"),  # Neon requires SSL
+        connection_factory=InstrumentedConnection   # cursors report timings to db_metrics
+    )
+
+    return connection
+
+
+# =====================================================
+# CONNECTION POOL
+# =====================================================
+# Opening a Neon connection costs a full TCP + TLS + auth handshake.
+# The pool keeps authenticated connections open and hands them out
+# again, so a dashboard render pays for its queries, not handshakes.
+
+class PoolTimeout(Exception):
+    """Raised when no pooled connection becomes available in time."""
+
+
+class ConnectionPool:
+    """
+    Small thread-safe pool of psycopg2 connections.
+
+    - min_size connections are opened up front and survive idle reaping
+    - at most max_size connections exist at any time
+    - connections older than max_lifetime seconds are retired
+    - idle connections beyond min_size are closed after max_idle seconds
+    - a connection idle for longer than ping_after seconds is checked with
+      SELECT 1 before being handed out (Neon drops idle sessions)
+    """
+
+    def __init__(
+        self,
+        connect,
+        min_size: int = 1,
+        max_size: int = 5,
+        max_lifetime: float = 1800.0,
+        max_idle: float = 300.0,
+        ping_after: float = 30.0,
+        timeout: float = 30.0
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError("Invalid pool size: need 0 <= min_size <= max_size and max_size >= 1")
+
+        self._connect = connect
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_lifetime = max_lifetime
+        self.max_idle = max_idle
+        self.ping_after = ping_after
+        self.timeout = timeout
+
+        self._cond = threading.Condition()
+        self._idle = deque()        # (connection, last_used), most recently used on the right
+        self._created_at = {}       # id(connection) -> creation time
+        self._size = 0              # open connections, idle + checked out
+        self._closed = False
+
+        for _ in range(min_size):
+            with self._cond:
+                self._size += 1
+            connection = self._open()
+            with self._cond:
+                self._idle.append((connection, time.monotonic()))
+
+    # -------------------------------------------------
+    # Internal helpers
+    # -------------------------------------------------
+
+    def _open(self):
+        """Open a new connection. The caller must already have reserved a slot in _size."""
+        try:
+            connection = self._connect()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        self._created_at[id(connection)] = time.monotonic()
+        return connection
+
+    def _close_quietly(self, connection):
+        self._created_at.pop(id(connection), None)
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+    def _discard(self, connection):
+        with self._cond:
+            self._size -= 1
+            self._cond.notify()
+        self._close_quietly(connection)
+
+    def _expired(self, connection, now: float) -> bool:
+        created = self._created_at.get(id(connection), now)
+        return self.max_lifetime > 0 and now - created > self.max_lifetime
+
+    def _healthy(self, connection, last_used: float, now: float) -> bool:
+        if connection.closed:
+            return False
+        if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            return False
+        if self.ping_after >= 0 and now - last_used > self.ping_after:
+            try:
+                with connection.cursor() as cursor:
+                    cursor.execute("SELECT 1")
+                connection.rollback()
+            except Exception:
+                return False
+        return True
+
+    def _reap(self, now: float) -> list:
+        """Pop idle connections past max_idle, keeping min_size. Call with the lock held."""
+        stale = []
+        if self.max_idle <= 0:
+            return stale
+        # Least recently used connections sit on the left
+        while self._idle and self._size > self.min_size:
+            connection, last_used = self._idle[0]
+            if now - last_used <= self.max_idle:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            stale.append(connection)
+        return stale
+
+    # -------------------------------------------------
+    # Public API
+    # -------------------------------------------------
+
+    def getconn(self):
+        """Check out a healthy connection, opening a new one if the pool has room."""
+        deadline = time.monotonic() + self.timeout
+        while True:
+            with self._cond:
+                if self._closed:
+                    raise PoolTimeout("Connection pool is closed")
+                now = time.monotonic()
+                stale = self._reap(now)
+                if self._idle:
+                    candidate = self._idle.pop()
+                elif self._size < self.max_size:
+                    candidate = None
+                    self._size += 1
+                else:
+                    remaining = deadline - now
+                    if remaining <= 0:
+                        raise PoolTimeout(
+                            f"No database connection available after {self.timeout:.0f}s "
+                            f"(max_size={self.max_size})"
+                        )
+                    self._cond.wait(remaining)
+                    continue
 
-        if connection.is_connected():
+            for connection in stale:
+                self._close_quietly(connection)
+
+            if candidate is None:
+                return self._open()
+
+            connection, last_used = candidate
+            now = time.monotonic()
+            if self._expired(connection, now) or not self._healthy(connection, last_used, now):
+                self._discard(connection)
+                continue
             return connection
-        """
-
-        # =====================================================
-        # POSTGRESQL CONNECTION (NEON) - ACTIVE
-        # =====================================================
-        connection = psycopg2.connect(
-            host=os.getenv("DB_HOST"),
-            port=int(os.getenv("DB_PORT", 5432)),
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            sslmode=os.getenv("DB_SSLMODE", "require")  # Neon requires SSL
+
+    def putconn(self, connection):
+        """Return a connection to the pool, rolling back any open transaction."""
+        if connection is None:
+            return
+        if id(connection) not in self._created_at:
+            # Not ours (or already discarded) - just close it
+            self._close_quietly(connection)
+            return
+
+        if not connection.closed and connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+            try:
+                connection.rollback()
+            except Exception:
+                pass
+
+        now = time.monotonic()
+        keep = (
+            not connection.closed
+            and connection.get_transaction_status() == TRANSACTION_STATUS_IDLE
+            and not self._expired(connection, now)
         )
+        with self._cond:
+            if keep and not self._closed:
+                self._idle.append((connection, now))
+                stale = self._reap(now)
+                self._cond.notify()
+            else:
+                self._size -= 1
+                self._cond.notify()
+                stale = [connection]
 
-        return connection
+        for stale_connection in stale:
+            self._close_quietly(stale_connection)
+
+    def closeall(self):
+        """Close every idle connection and refuse further checkouts."""
+        with self._cond:
+            self._closed = True
+            idle = [connection for connection, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for connection in idle:
+            self._close_quietly(connection)
+
+    def stats(self) -> dict:
+        """Current pool occupancy, e.g. for a debug panel."""
+        with self._cond:
+            return {
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Return the process-wide connection pool, creating it on first use.
+
+    Tunable through environment variables:
+    - DB_POOL_MIN_SIZE      (default 1)
+    - DB_POOL_MAX_SIZE      (default 5)
+    - DB_POOL_MAX_LIFETIME  seconds before a connection is retired (default 1800)
+    - DB_POOL_MAX_IDLE      seconds before an extra idle connection is closed (default 300)
+    - DB_POOL_PING_AFTER    idle seconds after which checkout runs SELECT 1 (default 30)
+    - DB_POOL_TIMEOUT       seconds to wait for a free connection (default 30)
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    create_connection,
+                    min_size=int(os.getenv("DB_POOL_MIN_SIZE", 1)),
+                    max_size=int(os.getenv("DB_POOL_MAX_SIZE", 5)),
+                    max_lifetime=float(os.getenv("DB_POOL_MAX_LIFETIME", 1800)),
+                    max_idle=float(os.getenv("DB_POOL_MAX_IDLE", 300)),
+                    ping_after=float(os.getenv("DB_POOL_PING_AFTER", 30)),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", 30))
+                )
+    return _pool
+
+
+def close_pool():
+    """Close all pooled connections (e.g. on shutdown or in scripts)."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
 
-    except PostgresError as e:
+
+def get_db_connection():
+    """
+    Check out a database connection from the pool.
+
+    Returns None if no connection could be established. Hand the
+    connection back with close_connection() - or use db_connection().
+    """
+    start = time.perf_counter()
+    try:
+        return get_pool().getconn()
+
+    except (PostgresError, PoolTimeout) as e:
         print(f"Error connecting to PostgreSQL (Neon): {e}")
         return None
 
+    except sqlite3.Error as e:
+        print(f"Error opening SQLite database: {e}")
+        return None
+
     # except MySQLError as e:
     #     print(f"Error connecting to MySQL: {e}")
     #     return None
 
+    finally:
+        record_connect((time.perf_counter() - start) * 1000)
+
 
 def close_connection(connection):
     """
-    Close the database connection safely.
+    Return the database connection to the pool.
 
-    Works for:
-    - PostgreSQL (Neon)
-    - MySQL (if re-enabled)
+    Any open transaction is rolled back first; broken or expired
+    connections are closed instead of being reused.
     """
-    if connection:
+    if not connection:
+        return
+    pool = _pool
+    if pool is not None:
+        pool.putconn(connection)
+    else:
         connection.close()
+
+
+@contextmanager
+def db_connection():
+    """
+    Context manager around get_db_connection() / close_connection().
+
+    Yields None when the database is unreachable, so callers keep the
+    usual "if not connection" guard:
+
+        with db_connection() as connection:
+            if not connection:
+                return []
+            ...
+    """
+    connection = get_db_connection()
+    try:
+        yield connection
+    finally:
+        close_connection(connection)
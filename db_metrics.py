@@ -0,0 +1,347 @@
+"""
+Timing instrumentation for db_operations
+
+Answers "is the dashboard slow because of connecting, running queries,
+or turning rows into Python objects?" without a profiler:
+
+- @instrumented wraps each db_operations function and records, per
+  function, the time spent checking out a connection (connect), in
+  cursor.execute / COPY (execute), in fetchone/fetchmany/fetchall
+  including row conversion (fetch), the whole call (total) and the
+  number of rows fetched
+- every connection is created with InstrumentedConnection, whose
+  cursors time themselves and report into the active call
+- statements slower than DB_SLOW_QUERY_MS (default 200) are logged to
+  the "db_operations.slow" logger with their parameters redacted, and
+  kept in a small ring buffer
+- async functions (db_async) are supported; asyncpg statements are
+  reported through record_query()
+- snapshot() returns everything as plain dicts for a debug panel or test
+"""
+
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import re
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+from dotenv import load_dotenv
+
+import psycopg2.extensions
+
+load_dotenv()
+
+logger = logging.getLogger("db_operations.slow")
+
+SLOW_QUERY_MS = float(os.getenv("DB_SLOW_QUERY_MS", 200))
+
+# Histogram bucket upper bounds
+TIME_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf"))
+ROW_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, float("inf"))
+
+UNSCOPED = "(unscoped)"
+
+
+class Histogram:
+    """Fixed-bucket histogram with count / sum / max and bucket-based percentiles."""
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def percentile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-th percentile (capped at max)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, count in zip(self.bounds, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "sum": round(self.total, 3),
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "p50": round(self.percentile(0.50), 3),
+            "p95": round(self.percentile(0.95), 3),
+            "buckets": {str(bound): count for bound, count in zip(self.bounds, self.counts)},
+        }
+
+
+class _Call:
+    """Phase timings accumulated during one instrumented call."""
+
+    __slots__ = ("name", "connect", "execute", "fetch", "rows")
+
+    def __init__(self, name: str):
+        self.name = name
+        self.connect = 0.0
+        self.execute = 0.0
+        self.fetch = 0.0
+        self.rows = 0
+
+
+_current_call = contextvars.ContextVar("db_metrics_call", default=None)
+_lock = threading.Lock()
+_histograms = {}                    # (operation, phase) -> Histogram
+_slow_queries = deque(maxlen=100)
+
+
+def _observe(operation: str, phase: str, value: float):
+    bounds = ROW_BUCKETS if phase == "rows" else TIME_BUCKETS_MS
+    with _lock:
+        histogram = _histograms.get((operation, phase))
+        if histogram is None:
+            histogram = _histograms[(operation, phase)] = Histogram(bounds)
+        histogram.observe(value)
+
+
+def _finish(call: _Call, total_ms: float):
+    _observe(call.name, "total", total_ms)
+    _observe(call.name, "connect", call.connect)
+    _observe(call.name, "execute", call.execute)
+    _observe(call.name, "fetch", call.fetch)
+    _observe(call.name, "rows", call.rows)
+
+
+def _redact(params):
+    """Replace parameter values with their type names so no data ends up in logs."""
+    if params is None:
+        return None
+    if isinstance(params, dict):
+        return {key: f"<{type(value).__name__}>" for key, value in params.items()}
+    if isinstance(params, (list, tuple)):
+        return [f"<{type(value).__name__}>" for value in params]
+    return f"<{type(params).__name__}>"
+
+
+def _mask_literals(sql: str) -> str:
+    """Mask inlined string / numeric literals (for queries with no separate params)."""
+    sql = re.sub(r"'(?:[^']|'')*'", "'?'", sql)
+    return re.sub(r"(?<![\w.])\d+(?:\.\d+)?\b", "?", sql)
+
+
+def _record(phase: str, elapsed_ms: float, rows: int = 0, query=None, params=None, mask: bool = False):
+    """
+    Attribute a phase timing to the active call (or UNSCOPED when there is none).
+
+    mask: the query carries its values inline (no separate params), so
+    literals are masked before it is logged.
+    """
+    call = _current_call.get()
+    if call is None:
+        _observe(UNSCOPED, phase, elapsed_ms)
+    else:
+        setattr(call, phase, getattr(call, phase) + elapsed_ms)
+        call.rows += rows
+
+    if query is not None and elapsed_ms >= SLOW_QUERY_MS:
+        if isinstance(query, bytes):
+            query = query.decode("utf-8", "replace")
+        if mask:
+            query = _mask_literals(str(query))
+        entry = {
+            "operation": call.name if call else UNSCOPED,
+            "elapsed_ms": round(elapsed_ms, 3),
+            "query": re.sub(r"\s+", " ", str(query)).strip(),
+            "params": _redact(params),
+            "at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with _lock:
+            _slow_queries.append(entry)
+        logger.warning(
+            "Slow query in %s (%.1f ms): %s params=%s",
+            entry["operation"], elapsed_ms, entry["query"], entry["params"]
+        )
+
+
+# ------------------------------------------------------------------
+# psycopg2 hooks
+# ------------------------------------------------------------------
+
+class TimedCursorMixin:
+    """Times execute / COPY / fetch* and reports them to the active call."""
+
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            _record("execute", (time.perf_counter() - start) * 1000, query=query, params=vars,
+                    mask=vars is None)
+
+    def copy_expert(self, sql, file, size=8192):
+        start = time.perf_counter()
+        try:
+            return super().copy_expert(sql, file, size)
+        finally:
+            _record("execute", (time.perf_counter() - start) * 1000, query=str(sql), mask=True)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        _record("fetch", (time.perf_counter() - start) * 1000, rows=0 if row is None else 1)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _record("fetch", (time.perf_counter() - start) * 1000, rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        _record("fetch", (time.perf_counter() - start) * 1000, rows=len(rows))
+        return rows
+
+
+_timed_cursor_classes = {}
+
+
+def timed_cursor_class(cursor_class):
+    """Subclass of cursor_class whose execute / fetch* report to db_metrics."""
+    timed = _timed_cursor_classes.get(cursor_class)
+    if timed is None:
+        timed = type(f"Timed{cursor_class.__name__}", (TimedCursorMixin, cursor_class), {})
+        _timed_cursor_classes[cursor_class] = timed
+    return timed
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """psycopg2 connection whose cursors (any cursor_factory) are timed."""
+
+    def cursor(self, *args, **kwargs):
+        factory = kwargs.get("cursor_factory") or self.cursor_factory or psycopg2.extensions.cursor
+        kwargs["cursor_factory"] = timed_cursor_class(factory)
+        return super().cursor(*args, **kwargs)
+
+
+def record_connect(elapsed_ms: float):
+    """Called by db_config with the time spent checking out a connection."""
+    _record("connect", elapsed_ms)
+
+
+def record_query(elapsed_ms: float, rows: int = 0, query=None, params=None):
+    """Called by db_async (asyncpg has no cursor to hook) for each statement."""
+    _record("execute", elapsed_ms, rows=rows, query=query, params=params)
+
+
+# ------------------------------------------------------------------
+# Public API
+# ------------------------------------------------------------------
+
+def instrumented(func):
+    """Record connect / execute / fetch / total time and row count for every call."""
+    name = func.__name__
+
+    if inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            # Each asyncio task runs in its own context copy, so concurrent calls don't mix
+            call = _Call(f"{name} (async)")
+            token = _current_call.set(call)
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _current_call.reset(token)
+                _finish(call, (time.perf_counter() - start) * 1000)
+        return async_wrapper
+
+    if inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def gen_wrapper(*args, **kwargs):
+            # Time only while the generator is running, not while the consumer holds a batch
+            call = _Call(name)
+            active = 0.0
+            generator = func(*args, **kwargs)
+            try:
+                while True:
+                    token = _current_call.set(call)
+                    start = time.perf_counter()
+                    try:
+                        item = next(generator)
+                    except StopIteration:
+                        return
+                    finally:
+                        active += (time.perf_counter() - start) * 1000
+                        _current_call.reset(token)
+                    yield item
+            finally:
+                generator.close()
+                _finish(call, active)
+        return gen_wrapper
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        call = _Call(name)
+        token = _current_call.set(call)
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current_call.reset(token)
+            _finish(call, (time.perf_counter() - start) * 1000)
+    return wrapper
+
+
+@contextmanager
+def timed(name: str):
+    """
+    Time an arbitrary block (e.g. DataFrame building in app.py) as its own operation:
+
+        with timed("show_history.dataframe"):
+            df = pd.DataFrame(data)
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _observe(name, "total", (time.perf_counter() - start) * 1000)
+
+
+def snapshot() -> dict:
+    """
+    Returns:
+        dict: {"operations": {operation: {phase: histogram dict}},
+               "slow_queries": [most recent slow statements, oldest first],
+               "slow_query_ms": threshold}
+        Times are in milliseconds; the "rows" phase counts rows.
+    """
+    with _lock:
+        operations = {}
+        for (operation, phase), histogram in sorted(_histograms.items()):
+            operations.setdefault(operation, {})[phase] = histogram.to_dict()
+        return {
+            "operations": operations,
+            "slow_queries": list(_slow_queries),
+            "slow_query_ms": SLOW_QUERY_MS,
+        }
+
+
+def reset():
+    """Clear all histograms and the slow query log."""
+    with _lock:
+        _histograms.clear()
+        _slow_queries.clear()
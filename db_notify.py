@@ -0,0 +1,141 @@
+"""
+Cross-process cache invalidation
+
+Every write to investment_category, portfolio_month or portfolio_value
+fires pg_notify('portfolio_data', <table name>) from the data_version
+trigger (migration 006), whichever process - or tool - made it. Each app
+process runs one background listener that turns those notifications into
+db_cache invalidations, so several Streamlit workers behind a load
+balancer can cache aggressively without serving each other stale data.
+
+- the listener holds one dedicated (unpooled) connection in LISTEN mode
+- after connecting or reconnecting it drops every cached read, since
+  notifications sent while it was away are lost
+- a SELECT 1 heartbeat every DB_CACHE_LISTEN_PING seconds (default 60)
+  detects connections the server or network dropped
+- on DB_BACKEND=sqlite there is no NOTIFY, so the listener polls the
+  data_version counters every DB_CACHE_LISTEN_POLL seconds (default 2)
+
+Set DB_CACHE_LISTEN=0 to disable. LISTEN needs a session, so on Neon point
+DB_HOST at the direct endpoint, not the "-pooler" one.
+"""
+
+import os
+import select
+import threading
+import time
+from dotenv import load_dotenv
+
+from psycopg2.extensions import ISOLATION_LEVEL_AUTOCOMMIT
+
+from db_cache import cache
+from db_config import DB_BACKEND, create_connection
+from db_operations import DATA_VERSION_TAGS, get_data_version
+
+load_dotenv()
+
+CHANNEL = "portfolio_data"
+
+LISTEN_ENABLED = os.getenv("DB_CACHE_LISTEN", "1") != "0"
+PING_SECONDS = float(os.getenv("DB_CACHE_LISTEN_PING", 60))
+POLL_SECONDS = float(os.getenv("DB_CACHE_LISTEN_POLL", 2))
+MAX_BACKOFF_SECONDS = 60.0
+
+_listener = None
+_listener_lock = threading.Lock()
+
+
+def _invalidate_all():
+    cache.invalidate(*DATA_VERSION_TAGS.values())
+
+
+def _close_quietly(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+def _listen(stop: threading.Event):
+    """LISTEN on CHANNEL until stop is set, reconnecting with backoff."""
+    backoff = 1.0
+    while not stop.is_set():
+        connection = None
+        try:
+            connection = create_connection()
+            connection.set_isolation_level(ISOLATION_LEVEL_AUTOCOMMIT)
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            _invalidate_all()
+            backoff = 1.0
+
+            last_heard = time.monotonic()
+            while not stop.is_set():
+                # Wake up at least once a second to notice stop
+                if select.select([connection], [], [], 1.0) == ([], [], []):
+                    if time.monotonic() - last_heard > PING_SECONDS:
+                        with connection.cursor() as cursor:
+                            cursor.execute("SELECT 1")
+                        last_heard = time.monotonic()
+                    continue
+
+                connection.poll()
+                last_heard = time.monotonic()
+                tags = {DATA_VERSION_TAGS.get(notify.payload) for notify in connection.notifies}
+                connection.notifies.clear()
+                tags.discard(None)
+                if tags:
+                    cache.invalidate(*tags)
+
+        except Exception as e:
+            print(f"Cache invalidation listener error (retrying in {backoff:.0f}s): {e}")
+            stop.wait(backoff)
+            backoff = min(backoff * 2, MAX_BACKOFF_SECONDS)
+
+        finally:
+            if connection is not None:
+                _close_quietly(connection)
+
+
+def _poll(stop: threading.Event):
+    """Embedded backend: invalidate the tags whose data_version counter moved."""
+    seen = get_data_version()
+    while not stop.wait(POLL_SECONDS):
+        current = get_data_version()
+        if not current:
+            continue
+        changed = [tag for tag, version in current.items() if seen.get(tag) != version]
+        if changed:
+            cache.invalidate(*changed)
+        seen = current
+
+
+def start_cache_listener() -> bool:
+    """
+    Start this process's invalidation listener (once; later calls are no-ops).
+
+    Returns:
+        bool: True if a listener is running
+    """
+    global _listener
+    if not LISTEN_ENABLED:
+        return False
+    with _listener_lock:
+        if _listener is None:
+            stop = threading.Event()
+            target = _poll if DB_BACKEND == "sqlite" else _listen
+            thread = threading.Thread(target=target, args=(stop,), name="db_cache_listener", daemon=True)
+            thread.start()
+            _listener = (thread, stop)
+    return True
+
+
+def stop_cache_listener():
+    """Stop the listener (e.g. in scripts and benchmarks)."""
+    global _listener
+    with _listener_lock:
+        if _listener is not None:
+            thread, stop = _listener
+            stop.set()
+            thread.join(timeout=5)
+            _listener = None
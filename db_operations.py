@@ -1,320 +1,1134 @@
 """
 Database operations for portfolio management
 (PostgreSQL / Neon compatible)
+
+All functions borrow a pooled connection through db_connection(),
+so no call pays a fresh connect/TLS handshake. Readers are served from
+the db_cache read-through cache; writers invalidate the tags they touch.
+Every public function is @instrumented (see db_metrics) - it sits outermost
+so cache hits are timed too.
+
+With DB_BACKEND=sqlite the same functions run against an embedded SQLite
+file (see db_sqlite.py); the few Postgres-only statements have a SQLite
+branch selected by _is_sqlite().
 """
 
-from db_config import get_db_connection, close_connection
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from db_config import db_connection
+from db_cache import cached, invalidates, set_version_source
+from db_metrics import instrumented
 from datetime import date
-from typing import List, Dict, Optional, Tuple
-from psycopg2.extras import RealDictCursor
+import pandas as pd
+from typing import Any, Iterator, List, Dict, Optional, Tuple
+from psycopg2.errors import UndefinedTable
+from psycopg2.extensions import encodings
+from psycopg2.extras import RealDictCursor, execute_values
+
+
+# Monthly totals come from the portfolio_month_total rollup, which
+# triggers keep current (see setup_rollup.py). Until it is installed,
+# the same queries fall back to aggregating portfolio_value.
+_MONTH_TOTALS = "portfolio_month_total"
+_MONTH_TOTALS_FALLBACK = """(
+    SELECT month_id, COUNT(*) AS category_count, SUM(amount) AS total_value
+    FROM portfolio_value
+    GROUP BY month_id
+)"""
+
+
+def _is_sqlite(connection) -> bool:
+    """True for db_sqlite connections (psycopg2 connections have no dialect)."""
+    return getattr(connection, "dialect", "postgres") == "sqlite"
+
+
+def _execute_month_totals(cursor, query: str, params) -> None:
+    """Execute a query that joins {month_totals}, falling back if the rollup is missing."""
+    try:
+        cursor.execute(query.format(month_totals=_MONTH_TOTALS), params)
+    except UndefinedTable:
+        cursor.connection.rollback()
+        cursor.execute(query.format(month_totals=_MONTH_TOTALS_FALLBACK), params)
+
+
+# ------------------------------------------------------------------
+# Data version
+# ------------------------------------------------------------------
+
+# db_cache tag for each table tracked in data_version (see migrations.py)
+DATA_VERSION_TAGS = {
+    "investment_category": "categories",
+    "portfolio_month": "months",
+    "portfolio_value": "values",
+}
+
+
+_DATA_VERSION = "SELECT table_name, version FROM data_version"
+
+
+@instrumented
+def get_data_version() -> Dict[str, int]:
+    """
+    Per-tag write counters from the data_version table, e.g.
+    {"categories": 3, "months": 12, "values": 240}.
+
+    Triggers bump a table's counter on every statement that writes to it,
+    so a cache can compare these three numbers instead of re-running its
+    query. Never cached. Returns {} if the database is unreachable or the
+    data_version migration has not been applied.
+    """
+    with db_connection() as connection:
+        if not connection:
+            return {}
+
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(_DATA_VERSION)
+            return {
+                DATA_VERSION_TAGS[table_name]: version
+                for table_name, version in cursor.fetchall()
+                if table_name in DATA_VERSION_TAGS
+            }
+        except Exception as e:
+            print(f"Error fetching data version: {e}")
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
+
+
+# The disk cache tier stamps its entries with these counters
+set_version_source(get_data_version)
 
 
 # ------------------------------------------------------------------
 # Categories
 # ------------------------------------------------------------------
 
+_ALL_CATEGORIES = """
+    SELECT category_id, category_name, description, is_active, created_at
+    FROM investment_category
+    WHERE is_active = TRUE
+    ORDER BY category_name
+"""
+
+
+@instrumented
+@cached("categories")
 def get_all_categories() -> List[Dict]:
-    connection = get_db_connection()
-    if not connection:
-        return []
+    with db_connection() as connection:
+        if not connection:
+            return []
 
-    cursor = None
-    try:
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        query = """
-            SELECT category_id, category_name, description, is_active, created_at
-            FROM investment_category
-            WHERE is_active = TRUE
-            ORDER BY category_name
-        """
-        cursor.execute(query)
-        return cursor.fetchall()
-    except Exception as e:
-        print(f"Error fetching categories: {e}")
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+        cursor = None
+        try:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(_ALL_CATEGORIES)
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Error fetching categories: {e}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
 
 
+_ADD_CATEGORY = """
+    INSERT INTO investment_category (category_name, description)
+    VALUES (%s, %s)
+"""
+
+
+@instrumented
+@invalidates("categories")
 def add_category(category_name: str, description: str = "") -> Tuple[bool, str]:
-    connection = get_db_connection()
-    if not connection:
-        return False, "Database connection failed"
+    with db_connection() as connection:
+        if not connection:
+            return False, "Database connection failed"
 
-    cursor = None
-    try:
-        cursor = connection.cursor()
-        query = """
-            INSERT INTO investment_category (category_name, description)
-            VALUES (%s, %s)
-        """
-        cursor.execute(query, (category_name, description))
-        connection.commit()
-        return True, "Category added successfully"
-    except Exception as e:
-        connection.rollback()
-        if "unique" in str(e).lower():
-            return False, f"Category '{category_name}' already exists"
-        return False, f"Error adding category: {e}"
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(_ADD_CATEGORY, (category_name, description))
+            connection.commit()
+            return True, "Category added successfully"
+        except Exception as e:
+            connection.rollback()
+            if "unique" in str(e).lower():
+                return False, f"Category '{category_name}' already exists"
+            return False, f"Error adding category: {e}"
+        finally:
+            if cursor:
+                cursor.close()
 
 
 # ------------------------------------------------------------------
 # Months
 # ------------------------------------------------------------------
 
+_MONTH_ID = """
+    SELECT month_id
+    FROM portfolio_month
+    WHERE year = %s AND month = %s
+"""
+
+_CREATE_MONTH = """
+    INSERT INTO portfolio_month (year, month, snapshot_date)
+    VALUES (%s, %s, %s)
+    RETURNING month_id
+"""
+
+
+@instrumented
+@invalidates("months")
 def get_or_create_month(year: int, month: int, snapshot_date: date) -> Optional[int]:
-    connection = get_db_connection()
-    if not connection:
-        return None
+    with db_connection() as connection:
+        if not connection:
+            return None
 
-    cursor = None
-    try:
-        cursor = connection.cursor()
-
-        # Check if month exists
-        check_query = """
-            SELECT month_id
-            FROM portfolio_month
-            WHERE year = %s AND month = %s
-        """
-        cursor.execute(check_query, (year, month))
-        row = cursor.fetchone()
-        if row:
-            return row[0]
-
-        # Insert new month and return ID
-        insert_query = """
-            INSERT INTO portfolio_month (year, month, snapshot_date)
-            VALUES (%s, %s, %s)
-            RETURNING month_id
-        """
-        cursor.execute(insert_query, (year, month, snapshot_date))
-        month_id = cursor.fetchone()[0]
-        connection.commit()
-        return month_id
-
-    except Exception as e:
-        connection.rollback()
-        print(f"Error getting/creating month: {e}")
-        return None
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+        cursor = None
+        try:
+            cursor = connection.cursor()
+
+            # Check if month exists
+            cursor.execute(_MONTH_ID, (year, month))
+            row = cursor.fetchone()
+            if row:
+                return row[0]
 
+            # Insert new month and return ID
+            cursor.execute(_CREATE_MONTH, (year, month, snapshot_date))
+            month_id = cursor.fetchone()[0]
+            connection.commit()
+            return month_id
 
+        except Exception as e:
+            connection.rollback()
+            print(f"Error getting/creating month: {e}")
+            return None
+        finally:
+            if cursor:
+                cursor.close()
+
+
+_ALL_MONTHS = """
+    SELECT month_id, year, month, snapshot_date
+    FROM portfolio_month
+    ORDER BY year DESC, month DESC
+"""
+
+
+@instrumented
+@cached("months")
 def get_all_months() -> List[Dict]:
-    connection = get_db_connection()
-    if not connection:
-        return []
+    with db_connection() as connection:
+        if not connection:
+            return []
 
-    cursor = None
-    try:
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        query = """
-            SELECT month_id, year, month, snapshot_date
-            FROM portfolio_month
-            ORDER BY year DESC, month DESC
-        """
-        cursor.execute(query)
-        return cursor.fetchall()
-    except Exception as e:
-        print(f"Error fetching months: {e}")
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+        cursor = None
+        try:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            cursor.execute(_ALL_MONTHS)
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Error fetching months: {e}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
 
 
 # ------------------------------------------------------------------
 # Portfolio Values
 # ------------------------------------------------------------------
 
+# Use ON CONFLICT to handle updates when the same month_id and category_id exist
+# value_id is auto-generated by PostgreSQL SERIAL, so we don't specify it
+_SAVE_VALUES = """
+    INSERT INTO portfolio_value (month_id, category_id, amount)
+    VALUES {values}
+    ON CONFLICT (month_id, category_id)
+    DO UPDATE SET
+        amount = EXCLUDED.amount,
+        updated_at = CURRENT_TIMESTAMP
+"""
+_SAVE_VALUE = _SAVE_VALUES.format(values="(%s, %s, %s)")
+
+
+@instrumented
+@invalidates("values")
 def save_portfolio_value(
     month_id: int,
     category_id: int,
     amount: float
 ) -> Tuple[bool, str]:
-    connection = get_db_connection()
-    if not connection:
-        return False, "Database connection failed"
+    with db_connection() as connection:
+        if not connection:
+            return False, "Database connection failed"
 
-    cursor = None
-    try:
-        cursor = connection.cursor()
-        # Use ON CONFLICT to handle updates when the same month_id and category_id exist
-        # value_id is auto-generated by PostgreSQL SERIAL, so we don't specify it
-        query = """
-            INSERT INTO portfolio_value (month_id, category_id, amount)
-            VALUES (%s, %s, %s)
-            ON CONFLICT (month_id, category_id)
-            DO UPDATE SET
-                amount = EXCLUDED.amount,
-                updated_at = CURRENT_TIMESTAMP
-        """
-        cursor.execute(query, (month_id, category_id, amount))
-        connection.commit()
-        return True, "Portfolio value saved successfully"
-    except Exception as e:
-        connection.rollback()
-        error_msg = str(e)
-        # Provide more helpful error message for sequence issues
-        if "duplicate key" in error_msg.lower() and "pkey" in error_msg.lower():
-            return False, f"Error saving portfolio value: duplicate key value violates unique constraint. Please run 'python fix_sequence.py' to fix the database sequence."
-        return False, f"Error saving portfolio value: {e}"
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(_SAVE_VALUE, (month_id, category_id, amount))
+            connection.commit()
+            return True, "Portfolio value saved successfully"
+        except Exception as e:
+            connection.rollback()
+            return False, _portfolio_value_error(e)
+        finally:
+            if cursor:
+                cursor.close()
+
+
+@instrumented
+@invalidates("values")
+def save_portfolio_values(
+    month_id: int,
+    amounts: Dict[int, float]
+) -> Dict[int, Tuple[bool, str]]:
+    """
+    Save a whole month of portfolio values in one transaction.
+
+    All rows go out as a single multi-row INSERT ... ON CONFLICT DO UPDATE.
+    If that statement fails (e.g. one category was deleted meanwhile), the
+    rows are retried one by one behind savepoints in the same transaction,
+    so the good rows are still saved and only the bad ones are reported.
+
+    Args:
+        month_id: portfolio_month.month_id to save under
+        amounts: {category_id: amount}
+
+    Returns:
+        {category_id: (success, message)} for every category passed in
+    """
+    if not amounts:
+        return {}
+
+    with db_connection() as connection:
+        if not connection:
+            return {category_id: (False, "Database connection failed") for category_id in amounts}
+
+        rows = [(month_id, category_id, amount) for category_id, amount in amounts.items()]
+
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            try:
+                if _is_sqlite(connection):
+                    # In-process: executemany costs no round trips
+                    cursor.executemany(_SAVE_VALUE, rows)
+                else:
+                    execute_values(cursor, _SAVE_VALUES.format(values="%s"), rows, page_size=len(rows))
+                connection.commit()
+                return {category_id: (True, "Portfolio value saved successfully") for category_id in amounts}
+            except Exception:
+                connection.rollback()
+
+            # Batch failed - isolate the failing rows with one savepoint per row
+            results = {}
+            for row in rows:
+                cursor.execute("SAVEPOINT save_value")
+                try:
+                    cursor.execute(_SAVE_VALUE, row)
+                    cursor.execute("RELEASE SAVEPOINT save_value")
+                    results[row[1]] = (True, "Portfolio value saved successfully")
+                except Exception as e:
+                    cursor.execute("ROLLBACK TO SAVEPOINT save_value")
+                    results[row[1]] = (False, _portfolio_value_error(e))
+            connection.commit()
+            return results
+        except Exception as e:
+            connection.rollback()
+            message = _portfolio_value_error(e)
+            return {category_id: (False, message) for category_id in amounts}
+        finally:
+            if cursor:
+                cursor.close()
+
+
+def _portfolio_value_error(error: Exception) -> str:
+    error_msg = str(error)
+    # Provide more helpful error message for sequence issues
+    if "duplicate key" in error_msg.lower() and "pkey" in error_msg.lower():
+        return "Error saving portfolio value: duplicate key value violates unique constraint. Please run 'python fix_sequence.py' to fix the database sequence."
+    return f"Error saving portfolio value: {error}"
+
+
+_SAVE_MONTH_SNAPSHOT = """
+    WITH m AS (
+        INSERT INTO portfolio_month (year, month, snapshot_date)
+        VALUES (%s, %s, %s)
+        ON CONFLICT ON CONSTRAINT uq_year_month
+        -- no-op update so RETURNING also yields an existing month
+        DO UPDATE SET snapshot_date = portfolio_month.snapshot_date
+        RETURNING month_id
+    ),
+    v AS (
+        INSERT INTO portfolio_value (month_id, category_id, amount)
+        SELECT m.month_id, d.category_id, d.amount
+        FROM m
+        CROSS JOIN unnest(%s::int[], %s::numeric[]) AS d(category_id, amount)
+        JOIN investment_category ic ON ic.category_id = d.category_id
+        ON CONFLICT (month_id, category_id)
+        DO UPDATE SET
+            amount = EXCLUDED.amount,
+            updated_at = CURRENT_TIMESTAMP
+        RETURNING category_id
+    )
+    SELECT (SELECT month_id FROM m) AS month_id, ARRAY(SELECT category_id FROM v) AS saved
+"""
+
+
+@instrumented
+@invalidates("months", "values")
+def save_month_snapshot(
+    year: int,
+    month: int,
+    snapshot_date: date,
+    amounts: Dict[int, float]
+) -> Tuple[Optional[int], Dict[int, Tuple[bool, str]]]:
+    """
+    Create (or look up) a month and upsert all of its values atomically.
+
+    A single statement does everything in one round trip:
+    - INSERT ... ON CONFLICT ON CONSTRAINT uq_year_month takes the month
+      row, so two concurrent submits for a new month cannot race
+    - the values are upserted from unnest() arrays, so the statement
+      size does not grow with the number of categories
+    Categories that no longer exist are skipped and reported as failed.
+
+    Returns:
+        (month_id, {category_id: (success, message)}); month_id is None
+        if the statement failed, in which case every row is reported failed
+    """
+    with db_connection() as connection:
+        if not connection:
+            return None, {category_id: (False, "Database connection failed") for category_id in amounts}
+
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            if _is_sqlite(connection):
+                month_id, saved = _save_month_snapshot_sqlite(cursor, year, month, snapshot_date, amounts)
+                connection.commit()
+                return month_id, _snapshot_results(amounts, saved)
+
+            category_ids = list(amounts.keys())
+            cursor.execute(_SAVE_MONTH_SNAPSHOT, (
+                year, month, snapshot_date,
+                category_ids, [amounts[category_id] for category_id in category_ids]
+            ))
+            month_id, saved = cursor.fetchone()
+            connection.commit()
+            return month_id, _snapshot_results(amounts, set(saved))
+
+        except Exception as e:
+            connection.rollback()
+            print(f"Error saving month snapshot: {e}")
+            message = _portfolio_value_error(e)
+            return None, {category_id: (False, message) for category_id in amounts}
+        finally:
+            if cursor:
+                cursor.close()
+
+
+def _save_month_snapshot_sqlite(cursor, year, month, snapshot_date, amounts):
+    """SQLite has no data-modifying CTEs: same work, one statement per row, one transaction."""
+    cursor.execute("""
+        INSERT INTO portfolio_month (year, month, snapshot_date)
+        VALUES (%s, %s, %s)
+        ON CONFLICT (year, month) DO NOTHING
+    """, (year, month, snapshot_date))
+    cursor.execute(_MONTH_ID, (year, month))
+    month_id = cursor.fetchone()[0]
 
+    saved = set()
+    query = """
+        INSERT INTO portfolio_value (month_id, category_id, amount)
+        SELECT %s, category_id, %s
+        FROM investment_category
+        WHERE category_id = %s
+        ON CONFLICT (month_id, category_id)
+        DO UPDATE SET
+            amount = EXCLUDED.amount,
+            updated_at = CURRENT_TIMESTAMP
+    """
+    for category_id, amount in amounts.items():
+        cursor.execute(query, (month_id, amount, category_id))
+        if cursor.rowcount:
+            saved.add(category_id)
+    return month_id, saved
+
+
+def _snapshot_results(amounts: Dict[int, float], saved: set) -> Dict[int, Tuple[bool, str]]:
+    return {
+        category_id: (True, "Portfolio value saved successfully")
+        if category_id in saved
+        else (False, f"Error saving portfolio value: category {category_id} does not exist")
+        for category_id in amounts
+    }
+
+
+_PORTFOLIO_DATA_SELECT = """
+    SELECT
+        pm.year,
+        pm.month,
+        pm.snapshot_date,
+        ic.category_name,
+        pv.amount,
+        pv.updated_at
+    FROM portfolio_value pv
+    JOIN portfolio_month pm ON pv.month_id = pm.month_id
+    JOIN investment_category ic ON pv.category_id = ic.category_id
+    WHERE 1 = 1
+"""
+_PORTFOLIO_DATA_ORDER = " ORDER BY pm.year DESC, pm.month DESC, ic.category_name"
+
+# Keyset condition for the rows after a page's last (year, month, category_name)
+_PORTFOLIO_DATA_AFTER = """
+    AND (
+        (pm.year, pm.month) < (%s, %s)
+        OR ((pm.year, pm.month) = (%s, %s) AND ic.category_name > %s)
+    )
+"""
+
+
+def _portfolio_data_filters(year: Optional[int], month: Optional[int]) -> Tuple[str, list]:
+    clause = ""
+    params = []
+
+    if year is not None:
+        clause += " AND pm.year = %s"
+        params.append(year)
+
+    if month is not None:
+        clause += " AND pm.month = %s"
+        params.append(month)
+
+    return clause, params
 
+
+@instrumented
 def get_portfolio_data(
     year: Optional[int] = None,
     month: Optional[int] = None
 ) -> List[Dict]:
-    connection = get_db_connection()
-    if not connection:
-        return []
+    with db_connection() as connection:
+        if not connection:
+            return []
 
-    cursor = None
-    try:
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        query = """
-            SELECT
-                pm.year,
-                pm.month,
-                pm.snapshot_date,
-                ic.category_name,
-                pv.amount,
-                pv.updated_at
-            FROM portfolio_value pv
-            JOIN portfolio_month pm ON pv.month_id = pm.month_id
-            JOIN investment_category ic ON pv.category_id = ic.category_id
-            WHERE 1 = 1
-        """
-        params = []
-
-        if year is not None:
-            query += " AND pm.year = %s"
-            params.append(year)
-
-        if month is not None:
-            query += " AND pm.month = %s"
-            params.append(month)
-
-        query += " ORDER BY pm.year DESC, pm.month DESC, ic.category_name"
+        cursor = None
+        try:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            clause, params = _portfolio_data_filters(year, month)
+            query = _PORTFOLIO_DATA_SELECT + clause
+            query += _PORTFOLIO_DATA_ORDER
 
-        cursor.execute(query, params)
-        return cursor.fetchall()
-    except Exception as e:
-        print(f"Error fetching portfolio data: {e}")
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"Error fetching portfolio data: {e}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+
+@instrumented
+def iter_portfolio_data(
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    batch_size: int = 1000
+) -> Iterator[List[Dict]]:
+    """
+    Stream get_portfolio_data rows in batches of up to batch_size.
+
+    Uses a server-side (named) cursor, so memory stays flat and the first
+    batch arrives without waiting for the whole history. The pooled
+    connection is held until the generator is exhausted or closed.
+    """
+    with db_connection() as connection:
+        if not connection:
+            return
+
+        cursor = None
+        try:
+            cursor = connection.cursor(name="portfolio_data_stream", cursor_factory=RealDictCursor)
+            cursor.itersize = batch_size
+            clause, params = _portfolio_data_filters(year, month)
+            query = _PORTFOLIO_DATA_SELECT + clause
+            query += _PORTFOLIO_DATA_ORDER
+
+            cursor.execute(query, params)
+            while True:
+                batch = cursor.fetchmany(batch_size)
+                if not batch:
+                    break
+                yield batch
+        except Exception as e:
+            print(f"Error streaming portfolio data: {e}")
+        finally:
+            if cursor:
+                cursor.close()
+
+
+@instrumented
+def get_portfolio_data_page(
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    after: Optional[Tuple[int, int, str]] = None,
+    limit: int = 100
+) -> Tuple[List[Dict], Optional[Tuple[int, int, str]]]:
+    """
+    One keyset-paginated page of get_portfolio_data.
+
+    Rows keep the get_portfolio_data order (newest month first, then
+    category name). Instead of OFFSET, each page starts right after the
+    (year, month, category_name) key of the previous page's last row, so
+    every page costs the same no matter how deep it is.
+
+    Args:
+        after: key returned as next_key by the previous page (None = first page)
+        limit: rows per page
+
+    Returns:
+        (rows, next_key); next_key is None on the last page
+    """
+    with db_connection() as connection:
+        if not connection:
+            return [], None
+
+        cursor = None
+        try:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            clause, params = _portfolio_data_filters(year, month)
+            query = _PORTFOLIO_DATA_SELECT + clause
+
+            if after is not None:
+                after_year, after_month, after_category = after
+                query += _PORTFOLIO_DATA_AFTER
+                params += [after_year, after_month, after_year, after_month, after_category]
+
+            query += _PORTFOLIO_DATA_ORDER + " LIMIT %s"
+            # Fetch one extra row to learn whether another page exists
+            params.append(limit + 1)
+
+            cursor.execute(query, params)
+            rows = cursor.fetchall()
+            if len(rows) <= limit:
+                return rows, None
+            rows = rows[:limit]
+            last = rows[-1]
+            return rows, (last["year"], last["month"], last["category_name"])
+        except Exception as e:
+            print(f"Error fetching portfolio data page: {e}")
+            return [], None
+        finally:
+            if cursor:
+                cursor.close()
+
+
+_PORTFOLIO_DATA_STATS = """
+    SELECT
+        COUNT(*) AS total_records,
+        COUNT(DISTINCT pm.month_id) AS unique_months,
+        COALESCE(SUM(pv.amount), 0) AS total_value
+    FROM portfolio_value pv
+    JOIN portfolio_month pm ON pv.month_id = pm.month_id
+    WHERE 1 = 1
+"""
 
 
+@instrumented
+@cached("months", "values")
+def get_portfolio_data_stats(
+    year: Optional[int] = None,
+    month: Optional[int] = None
+) -> Dict:
+    """
+    Record count, distinct months and total amount for the
+    get_portfolio_data filters, computed in the database.
+    """
+    with db_connection() as connection:
+        if not connection:
+            return {}
+
+        cursor = None
+        try:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            clause, params = _portfolio_data_filters(year, month)
+            cursor.execute(_PORTFOLIO_DATA_STATS + clause, params)
+            row = cursor.fetchone()
+            return row if row else {}
+        except Exception as e:
+            print(f"Error fetching portfolio data stats: {e}")
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
+
+
+_MONTHLY_SUMMARY = """
+    SELECT
+        pm.year,
+        pm.month,
+        pm.snapshot_date,
+        COALESCE(t.category_count, 0) AS category_count,
+        COALESCE(t.total_value, 0) AS total_value
+    FROM portfolio_month pm
+    LEFT JOIN {month_totals} t ON pm.month_id = t.month_id
+    WHERE pm.year = %s AND pm.month = %s
+"""
+
+
+@instrumented
+@cached("months", "values")
 def get_monthly_summary(year: int, month: int) -> Dict:
-    connection = get_db_connection()
-    if not connection:
-        return {}
+    with db_connection() as connection:
+        if not connection:
+            return {}
 
-    cursor = None
-    try:
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        query = """
-            SELECT
-                pm.year,
-                pm.month,
-                pm.snapshot_date,
-                COUNT(pv.value_id) AS category_count,
-                COALESCE(SUM(pv.amount), 0) AS total_value
-            FROM portfolio_month pm
-            LEFT JOIN portfolio_value pv ON pm.month_id = pv.month_id
-            WHERE pm.year = %s AND pm.month = %s
-            GROUP BY pm.month_id, pm.year, pm.month, pm.snapshot_date
-        """
-        cursor.execute(query, (year, month))
-        row = cursor.fetchone()
-        return row if row else {}
-    except Exception as e:
-        print(f"Error fetching monthly summary: {e}")
-        return {}
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+        cursor = None
+        try:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            _execute_month_totals(cursor, _MONTHLY_SUMMARY, (year, month))
+            row = cursor.fetchone()
+            return row if row else {}
+        except Exception as e:
+            print(f"Error fetching monthly summary: {e}")
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
 
 
 # ------------------------------------------------------------------
 # Delete / Update
 # ------------------------------------------------------------------
 
+_DELETE_CATEGORY = """
+    UPDATE investment_category
+    SET is_active = FALSE
+    WHERE category_id = %s
+"""
+
+
+@instrumented
+@invalidates("categories")
 def delete_category(category_id: int) -> Tuple[bool, str]:
-    connection = get_db_connection()
-    if not connection:
-        return False, "Database connection failed"
+    with db_connection() as connection:
+        if not connection:
+            return False, "Database connection failed"
 
-    cursor = None
-    try:
-        cursor = connection.cursor()
-        query = """
-            UPDATE investment_category
-            SET is_active = FALSE
-            WHERE category_id = %s
-        """
-        cursor.execute(query, (category_id,))
-        connection.commit()
-        return True, "Category deleted successfully"
-    except Exception as e:
-        connection.rollback()
-        return False, f"Error deleting category: {e}"
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            cursor.execute(_DELETE_CATEGORY, (category_id,))
+            connection.commit()
+            return True, "Category deleted successfully"
+        except Exception as e:
+            connection.rollback()
+            return False, f"Error deleting category: {e}"
+        finally:
+            if cursor:
+                cursor.close()
+
+
+_VALUE_HISTORY = """
+    SELECT
+        pm.year,
+        pm.month,
+        pm.snapshot_date,
+        COALESCE(t.total_value, 0) AS total_value
+    FROM portfolio_month pm
+    LEFT JOIN {month_totals} t ON pm.month_id = t.month_id
+    ORDER BY pm.year DESC, pm.month DESC
+    LIMIT %s
+"""
 
 
+@instrumented
+@cached("months", "values")
 def get_portfolio_value_history(num_months: int = 6) -> List[Dict]:
     """
     Get historical portfolio values aggregated by month
     Returns the most recent N months with total portfolio values
     """
-    connection = get_db_connection()
-    if not connection:
-        return []
+    with db_connection() as connection:
+        if not connection:
+            return []
 
-    cursor = None
-    try:
-        cursor = connection.cursor(cursor_factory=RealDictCursor)
-        query = """
-            SELECT
-                pm.year,
-                pm.month,
-                pm.snapshot_date,
-                COALESCE(SUM(pv.amount), 0) AS total_value
-            FROM portfolio_month pm
-            LEFT JOIN portfolio_value pv ON pm.month_id = pv.month_id
-            GROUP BY pm.month_id, pm.year, pm.month, pm.snapshot_date
-            ORDER BY pm.year DESC, pm.month DESC
-            LIMIT %s
-        """
-        cursor.execute(query, (num_months,))
-        results = cursor.fetchall()
-        # Return in chronological order (oldest first) for chart display
-        return list(reversed(results))
-    except Exception as e:
-        print(f"Error fetching portfolio value history: {e}")
-        return []
-    finally:
-        if cursor:
-            cursor.close()
-        close_connection(connection)
+        cursor = None
+        try:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            _execute_month_totals(cursor, _VALUE_HISTORY, (num_months,))
+            results = cursor.fetchall()
+            # Return in chronological order (oldest first) for chart display
+            return list(reversed(results))
+        except Exception as e:
+            print(f"Error fetching portfolio value history: {e}")
+            return []
+        finally:
+            if cursor:
+                cursor.close()
+
+
+# ------------------------------------------------------------------
+# Dashboard
+# ------------------------------------------------------------------
+
+_DASHBOARD_BUNDLE = """
+    WITH selected AS (
+        SELECT month_id
+        FROM portfolio_month
+        WHERE (%(year)s::int IS NULL OR year = %(year)s)
+          AND (%(month)s::int IS NULL OR month = %(month)s)
+        ORDER BY year DESC, month DESC
+        LIMIT 1
+    ),
+    totals AS NOT MATERIALIZED (
+        SELECT
+            pm.month_id,
+            pm.year,
+            pm.month,
+            pm.snapshot_date,
+            COALESCE(t.category_count, 0) AS category_count,
+            COALESCE(t.total_value, 0) AS total_value
+        FROM portfolio_month pm
+        LEFT JOIN {month_totals} t ON pm.month_id = t.month_id
+    )
+    -- Leftmost branch names the columns (and, on SQLite, their types)
+    SELECT 'breakdown' AS kind, pm.month_id, pm.year, pm.month, pm.snapshot_date,
+           ic.category_name, pv.amount,
+           NULL::bigint AS category_count, pv.updated_at
+    FROM portfolio_value pv
+    JOIN selected s ON s.month_id = pv.month_id
+    JOIN portfolio_month pm ON pv.month_id = pm.month_id
+    JOIN investment_category ic ON pv.category_id = ic.category_id
+    UNION ALL
+    SELECT 'month', month_id, year, month, snapshot_date,
+           NULL, NULL, NULL, NULL
+    FROM portfolio_month
+    UNION ALL
+    SELECT 'summary', t.month_id, t.year, t.month, t.snapshot_date,
+           NULL, t.total_value, t.category_count, NULL
+    FROM totals t
+    JOIN selected s ON s.month_id = t.month_id
+    UNION ALL
+    SELECT * FROM (
+        SELECT 'history', month_id, year, month, snapshot_date,
+               NULL::varchar, total_value, NULL::bigint, NULL::timestamp
+        FROM totals
+        ORDER BY year DESC, month DESC
+        LIMIT %(num_months)s
+    ) history
+"""
+
+
+@instrumented
+@cached("categories", "months", "values")
+def get_dashboard_bundle(
+    year: Optional[int] = None,
+    month: Optional[int] = None,
+    num_months: int = 6
+) -> Dict:
+    """
+    Load everything show_dashboard needs in a single round trip.
+
+    One UNION ALL query returns four kinds of rows, split apart here:
+    - months:    every portfolio_month (same shape as get_all_months)
+    - summary:   the selected month (same shape as get_monthly_summary)
+    - history:   last num_months totals, oldest first
+                 (same shape as get_portfolio_value_history)
+    - breakdown: the selected month's values per category
+                 (same shape as get_portfolio_data(year, month))
+
+    The selected month is year/month when both are given, otherwise the
+    latest month (within year, if only year is given).
+
+    Returns:
+        {"months", "year", "month", "summary", "history", "breakdown"},
+        or {} on error
+    """
+    with db_connection() as connection:
+        if not connection:
+            return {}
+
+        cursor = None
+        try:
+            cursor = connection.cursor(cursor_factory=RealDictCursor)
+            _execute_month_totals(cursor, _DASHBOARD_BUNDLE, {"year": year, "month": month, "num_months": num_months})
+            return _split_dashboard_bundle(cursor.fetchall())
+        except Exception as e:
+            print(f"Error fetching dashboard bundle: {e}")
+            return {}
+        finally:
+            if cursor:
+                cursor.close()
+
+
+def _split_dashboard_bundle(rows: List[Dict]) -> Dict:
+    """Split _DASHBOARD_BUNDLE rows into get_dashboard_bundle's dict."""
+    bundle = {"months": [], "year": None, "month": None, "summary": {}, "history": [], "breakdown": []}
+    for row in rows:
+        kind = row["kind"]
+        if kind == "month":
+            bundle["months"].append({
+                "month_id": row["month_id"],
+                "year": row["year"],
+                "month": row["month"],
+                "snapshot_date": row["snapshot_date"],
+            })
+        elif kind == "summary":
+            bundle["year"], bundle["month"] = row["year"], row["month"]
+            bundle["summary"] = {
+                "year": row["year"],
+                "month": row["month"],
+                "snapshot_date": row["snapshot_date"],
+                "category_count": row["category_count"],
+                "total_value": row["amount"],
+            }
+        elif kind == "history":
+            bundle["history"].append({
+                "year": row["year"],
+                "month": row["month"],
+                "snapshot_date": row["snapshot_date"],
+                "total_value": row["amount"],
+            })
+        else:
+            bundle["breakdown"].append({
+                "year": row["year"],
+                "month": row["month"],
+                "snapshot_date": row["snapshot_date"],
+                "category_name": row["category_name"],
+                "amount": row["amount"],
+                "updated_at": row["updated_at"],
+            })
+
+    # UNION ALL does not keep per-branch order, so restore it here
+    bundle["months"].sort(key=lambda m: (m["year"], m["month"]), reverse=True)
+    # History is returned oldest first for chart display
+    bundle["history"].sort(key=lambda m: (m["year"], m["month"]))
+    bundle["breakdown"].sort(key=lambda v: v["category_name"])
+    return bundle
+
+
+# ------------------------------------------------------------------
+# Read-only ad-hoc queries
+# ------------------------------------------------------------------
+
+READ_ONLY_MAX_ROWS = 500
+READ_ONLY_TIMEOUT_MS = 5000
+
+
+@instrumented
+def run_read_only_query(
+    query: str,
+    params: Optional[Dict[str, Any]] = None
+) -> Optional[Tuple[List[str], List[tuple]]]:
+    """
+    Run a single SELECT that did not come from this module (the chatbot's
+    saved SQL plans, see chat_plans.py) without letting it write.
+
+    PostgreSQL runs it in a READ ONLY transaction with a statement
+    timeout; SQLite with PRAGMA query_only. Not cached: callers want
+    current data. Literal % signs must be doubled (psycopg2 paramstyle).
+
+    Returns:
+        (column names, up to READ_ONLY_MAX_ROWS rows), or None on error
+    """
+    with db_connection() as connection:
+        if not connection:
+            return None
+
+        cursor = None
+        sqlite = _is_sqlite(connection)
+        try:
+            cursor = connection.cursor()
+            if sqlite:
+                cursor.execute("PRAGMA query_only = ON")
+            else:
+                cursor.execute("SET TRANSACTION READ ONLY")
+                cursor.execute(f"SET LOCAL statement_timeout = {READ_ONLY_TIMEOUT_MS}")
+            cursor.execute(query, params or {})
+            columns = [column[0] for column in cursor.description]
+            return columns, cursor.fetchmany(READ_ONLY_MAX_ROWS)
+        except Exception as e:
+            print(f"Error running read-only query: {e}")
+            return None
+        finally:
+            if cursor:
+                if sqlite:
+                    cursor.execute("PRAGMA query_only = OFF")
+                cursor.close()
+            connection.rollback()
+
+
+# ------------------------------------------------------------------
+# Prefetch
+# ------------------------------------------------------------------
+# Independent readers don't have to wait for each other: each one
+# borrows its own pooled connection, so several reads issued together
+# cost roughly the slowest round trip instead of the sum of them.
+
+_prefetch_executor = None
+_prefetch_lock = threading.Lock()
+
+
+def _get_prefetch_executor() -> ThreadPoolExecutor:
+    global _prefetch_executor
+    if _prefetch_executor is None:
+        with _prefetch_lock:
+            if _prefetch_executor is None:
+                # More workers than pooled connections would only queue in getconn()
+                workers = int(os.getenv("DB_PREFETCH_WORKERS", os.getenv("DB_POOL_MAX_SIZE", 5)))
+                _prefetch_executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix="db_prefetch")
+    return _prefetch_executor
+
+
+def prefetch(**calls) -> Dict[str, Any]:
+    """
+    Run independent readers concurrently and return their results by name.
+
+        results = prefetch(
+            page=(get_portfolio_data_page, year, month, after, 100),
+            stats=(get_portfolio_data_stats, year, month),
+        )
+
+    Each call is a (function, *args) tuple. Readers still go through
+    their cache: a cached call still runs on a pool thread, but returns
+    without borrowing a database connection. Exceptions raised by a
+    reader are re-raised here.
+
+    DB_PREFETCH_WORKERS bounds the thread pool (default DB_POOL_MAX_SIZE).
+    """
+    if len(calls) <= 1:
+        return {name: func(*args) for name, (func, *args) in calls.items()}
+
+    executor = _get_prefetch_executor()
+    futures = {name: executor.submit(func, *args) for name, (func, *args) in calls.items()}
+    return {name: future.result() for name, future in futures.items()}
+
+
+# ------------------------------------------------------------------
+# Columnar (pandas) readers
+# ------------------------------------------------------------------
+# These skip RealDictCursor entirely: rows are streamed with COPY ... TO
+# STDOUT as CSV and parsed by pandas' C reader straight into typed
+# columns, so there is no per-row dict and no per-value Decimal.
+# Amounts come back as float64 (use .to_numpy() for a plain array).
+
+_PORTFOLIO_DATA_DTYPES = {
+    "year": "int16",
+    "month": "int8",
+    "category_name": "string",
+    "amount": "float64",
+}
+
+_VALUE_HISTORY_DTYPES = {
+    "year": "int16",
+    "month": "int8",
+    "total_value": "float64",
+}
+
+
+def _copy_frame(cursor, query: str, params, dtypes: Dict, parse_dates: List[str]) -> pd.DataFrame:
+    """Run query through COPY ... TO STDOUT and parse the CSV into a typed DataFrame."""
+    if _is_sqlite(cursor.connection):
+        # No COPY in SQLite, but rows are plain tuples already - build the frame directly
+        cursor.execute(query, params)
+        frame = pd.DataFrame(cursor.fetchall(), columns=[column[0] for column in cursor.description])
+        for column in parse_dates:
+            frame[column] = pd.to_datetime(frame[column])
+        return frame.astype(dtypes)
+
+    buffer = io.StringIO()
+    # COPY takes no bind parameters, so inline them with psycopg2's own quoting
+    sql = cursor.mogrify(query, params).decode(encodings[cursor.connection.encoding])
+    cursor.copy_expert(f"COPY ({sql}) TO STDOUT WITH (FORMAT csv, HEADER)", buffer)
+    buffer.seek(0)
+    return pd.read_csv(buffer, dtype=dtypes, parse_dates=parse_dates)
+
+
+@instrumented
+def get_portfolio_data_frame(
+    year: Optional[int] = None,
+    month: Optional[int] = None
+) -> pd.DataFrame:
+    """
+    Columnar get_portfolio_data: same rows and order, as a typed DataFrame.
+
+    Columns: year (int16), month (int8), snapshot_date / updated_at
+    (datetime64), category_name (string), amount (float64)
+    """
+    columns = ["year", "month", "snapshot_date", "category_name", "amount", "updated_at"]
+    with db_connection() as connection:
+        if not connection:
+            return pd.DataFrame(columns=columns)
+
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            clause, params = _portfolio_data_filters(year, month)
+            query = _PORTFOLIO_DATA_SELECT + clause
+            query += _PORTFOLIO_DATA_ORDER
+
+            return _copy_frame(cursor, query, params, _PORTFOLIO_DATA_DTYPES, ["snapshot_date", "updated_at"])
+        except Exception as e:
+            print(f"Error fetching portfolio data frame: {e}")
+            return pd.DataFrame(columns=columns)
+        finally:
+            if cursor:
+                cursor.close()
+
+
+@instrumented
+def get_portfolio_value_history_frame(num_months: int = 6) -> pd.DataFrame:
+    """
+    Columnar get_portfolio_value_history: last N monthly totals, oldest first.
+
+    Columns: year (int16), month (int8), snapshot_date (datetime64),
+    total_value (float64)
+    """
+    columns = ["year", "month", "snapshot_date", "total_value"]
+    with db_connection() as connection:
+        if not connection:
+            return pd.DataFrame(columns=columns)
+
+        cursor = None
+        try:
+            cursor = connection.cursor()
+            query = """
+                SELECT * FROM (
+                    SELECT
+                        pm.year,
+                        pm.month,
+                        pm.snapshot_date,
+                        COALESCE(t.total_value, 0) AS total_value
+                    FROM portfolio_month pm
+                    LEFT JOIN {month_totals} t ON pm.month_id = t.month_id
+                    ORDER BY pm.year DESC, pm.month DESC
+                    LIMIT %s
+                ) recent
+                ORDER BY year, month
+            """
+            try:
+                return _copy_frame(
+                    cursor, query.format(month_totals=_MONTH_TOTALS), (num_months,),
+                    _VALUE_HISTORY_DTYPES, ["snapshot_date"]
+                )
+            except UndefinedTable:
+                connection.rollback()
+                return _copy_frame(
+                    cursor, query.format(month_totals=_MONTH_TOTALS_FALLBACK), (num_months,),
+                    _VALUE_HISTORY_DTYPES, ["snapshot_date"]
+                )
+        except Exception as e:
+            print(f"Error fetching portfolio value history frame: {e}")
+            return pd.DataFrame(columns=columns)
+        finally:
+            if cursor:
+                cursor.close()
@@ -0,0 +1,316 @@
+"""
+Embedded SQLite backend
+
+Lets db_operations run unchanged against a local SQLite file instead of
+PostgreSQL (Neon): no network round trips, no server to run. Useful for
+single-user / offline deployments, tests and benchmarks.
+
+Enable with:
+    DB_BACKEND=sqlite
+    SQLITE_PATH=portfolio.db     (default; ":memory:" is not shared between connections)
+
+The adapter classes below mimic the small part of the psycopg2 API that
+db_config's pool and db_operations use:
+- %s / %(name)s placeholders and ::type casts are translated to SQLite
+- cursor(cursor_factory=RealDictCursor) returns rows as dicts
+- closed / get_transaction_status() / commit() / rollback()
+
+The schema (including the portfolio_month_total rollup and the
+data_version counters, kept current by row-level triggers) is created on
+first connect.
+"""
+
+import os
+import re
+import sqlite3
+from datetime import date, datetime
+
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE, TRANSACTION_STATUS_INTRANS
+from psycopg2.extras import RealDictCursor
+
+from db_metrics import timed_cursor_class
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS investment_category (
+    category_id INTEGER PRIMARY KEY,
+    category_name VARCHAR(100) NOT NULL UNIQUE,
+    description VARCHAR(255),
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_month (
+    month_id INTEGER PRIMARY KEY,
+    year SMALLINT NOT NULL,
+    month SMALLINT NOT NULL,
+    snapshot_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_year_month UNIQUE (year, month),
+    CONSTRAINT chk_month CHECK (month BETWEEN 1 AND 12)
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_value (
+    value_id INTEGER PRIMARY KEY,
+    month_id INT NOT NULL REFERENCES portfolio_month(month_id),
+    category_id INT NOT NULL REFERENCES investment_category(category_id),
+    amount REAL NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    UNIQUE (month_id, category_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_portfolio_value_category
+    ON portfolio_value (category_id);
+
+CREATE INDEX IF NOT EXISTS idx_investment_category_active_name
+    ON investment_category (category_name)
+    WHERE is_active;
+
+CREATE TABLE IF NOT EXISTS portfolio_month_total (
+    month_id INTEGER PRIMARY KEY REFERENCES portfolio_month(month_id) ON DELETE CASCADE,
+    total_value REAL NOT NULL DEFAULT 0,
+    category_count INT NOT NULL DEFAULT 0
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_portfolio_month_total_month
+AFTER INSERT ON portfolio_month
+BEGIN
+    INSERT INTO portfolio_month_total (month_id)
+    SELECT NEW.month_id
+    WHERE NOT EXISTS (SELECT 1 FROM portfolio_month_total WHERE month_id = NEW.month_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_portfolio_month_total_insert
+AFTER INSERT ON portfolio_value
+BEGIN
+    INSERT INTO portfolio_month_total (month_id)
+    SELECT NEW.month_id
+    WHERE NOT EXISTS (SELECT 1 FROM portfolio_month_total WHERE month_id = NEW.month_id);
+    UPDATE portfolio_month_total
+    SET total_value = total_value + NEW.amount,
+        category_count = category_count + 1
+    WHERE month_id = NEW.month_id;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_portfolio_month_total_update
+AFTER UPDATE OF month_id, amount ON portfolio_value
+BEGIN
+    UPDATE portfolio_month_total
+    SET total_value = total_value - OLD.amount,
+        category_count = category_count - 1
+    WHERE month_id = OLD.month_id;
+    INSERT INTO portfolio_month_total (month_id)
+    SELECT NEW.month_id
+    WHERE NOT EXISTS (SELECT 1 FROM portfolio_month_total WHERE month_id = NEW.month_id);
+    UPDATE portfolio_month_total
+    SET total_value = total_value + NEW.amount,
+        category_count = category_count + 1
+    WHERE month_id = NEW.month_id;
+END;
+
+CREATE TABLE IF NOT EXISTS data_version (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT OR IGNORE INTO data_version (table_name)
+VALUES ('investment_category'), ('portfolio_month'), ('portfolio_value');
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_investment_category_insert
+AFTER INSERT ON investment_category
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'investment_category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_investment_category_update
+AFTER UPDATE ON investment_category
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'investment_category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_investment_category_delete
+AFTER DELETE ON investment_category
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'investment_category';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_portfolio_month_insert
+AFTER INSERT ON portfolio_month
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'portfolio_month';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_portfolio_month_update
+AFTER UPDATE ON portfolio_month
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'portfolio_month';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_portfolio_month_delete
+AFTER DELETE ON portfolio_month
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'portfolio_month';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_portfolio_value_insert
+AFTER INSERT ON portfolio_value
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'portfolio_value';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_portfolio_value_update
+AFTER UPDATE ON portfolio_value
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'portfolio_value';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_data_version_portfolio_value_delete
+AFTER DELETE ON portfolio_value
+BEGIN
+    UPDATE data_version SET version = version + 1, updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = 'portfolio_value';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_portfolio_month_total_delete
+AFTER DELETE ON portfolio_value
+BEGIN
+    UPDATE portfolio_month_total
+    SET total_value = total_value - OLD.amount,
+        category_count = category_count - 1
+    WHERE month_id = OLD.month_id;
+END;
+"""
+
+
+# Dates / timestamps round-trip as ISO strings (stdlib default adapters are deprecated)
+sqlite3.register_adapter(date, lambda value: value.isoformat())
+sqlite3.register_adapter(datetime, lambda value: value.isoformat(" "))
+sqlite3.register_converter("DATE", lambda value: date.fromisoformat(value.decode()))
+sqlite3.register_converter("TIMESTAMP", lambda value: datetime.fromisoformat(value.decode()))
+
+
+# One pass, so the "%s" in an escaped '%%stocks%%' is never read as a placeholder
+_PLACEHOLDER = re.compile(r"%\((\w+)\)s|%s|%%")
+_CAST = re.compile(r"::\w+(\[\])?")
+
+
+def _placeholder(match) -> str:
+    if match.group(1):
+        return f":{match.group(1)}"
+    return "?" if match.group(0) == "%s" else "%"
+
+
+def translate(query: str) -> str:
+    """Rewrite psycopg2-style SQL for sqlite3: placeholders and ::casts."""
+    return _PLACEHOLDER.sub(_placeholder, _CAST.sub("", query))
+
+
+class SQLiteCursor:
+    """psycopg2-flavoured wrapper around a sqlite3 cursor."""
+
+    def __init__(self, connection, dict_rows: bool = False):
+        self.connection = connection
+        self._cursor = connection._raw.cursor()
+        self._dict_rows = dict_rows
+        self.arraysize = 1
+        self.itersize = 2000
+
+    @property
+    def description(self):
+        return self._cursor.description
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+    def _row(self, row):
+        if row is None or not self._dict_rows:
+            return row
+        return dict(zip((column[0] for column in self._cursor.description), row))
+
+    def execute(self, query, vars=None):
+        # sqlite3 only opens a transaction implicitly before DML; a SAVEPOINT
+        # outside one would start (and on RELEASE commit) its own
+        if not self.connection._raw.in_transaction and query.lstrip().upper().startswith("SAVEPOINT"):
+            self._cursor.execute("BEGIN")
+        self._cursor.execute(translate(query), () if vars is None else vars)
+
+    def executemany(self, query, vars_list):
+        self._cursor.executemany(translate(query), vars_list)
+
+    def fetchone(self):
+        return self._row(self._cursor.fetchone())
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(self.arraysize if size is None else size)
+        return [self._row(row) for row in rows]
+
+    def fetchall(self):
+        return [self._row(row) for row in self._cursor.fetchall()]
+
+    def close(self):
+        self._cursor.close()
+
+    def __iter__(self):
+        return iter(self.fetchone, None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class SQLiteConnection:
+    """psycopg2-flavoured wrapper around a sqlite3 connection."""
+
+    dialect = "sqlite"
+    encoding = "UTF8"
+
+    def __init__(self, raw: sqlite3.Connection):
+        self._raw = raw
+        self.closed = 0
+
+    def cursor(self, name=None, cursor_factory=None):
+        # Server-side cursor names are meaningless here: sqlite3 cursors are already lazy
+        dict_rows = cursor_factory is not None and issubclass(cursor_factory, RealDictCursor)
+        return timed_cursor_class(SQLiteCursor)(self, dict_rows=dict_rows)
+
+    def get_transaction_status(self):
+        return TRANSACTION_STATUS_INTRANS if self._raw.in_transaction else TRANSACTION_STATUS_IDLE
+
+    def commit(self):
+        self._raw.commit()
+
+    def rollback(self):
+        self._raw.rollback()
+
+    def close(self):
+        if not self.closed:
+            self._raw.close()
+            self.closed = 1
+
+
+def connect_sqlite(path: str = None) -> SQLiteConnection:
+    """Open (and if needed initialise) the SQLite database at path / SQLITE_PATH."""
+    path = path or os.getenv("SQLITE_PATH", "portfolio.db")
+    raw = sqlite3.connect(
+        path,
+        detect_types=sqlite3.PARSE_DECLTYPES,
+        check_same_thread=False,    # the pool hands a connection to one thread at a time
+        timeout=30
+    )
+    raw.execute("PRAGMA foreign_keys = ON")
+    raw.execute("PRAGMA journal_mode = WAL")    # readers don't block the writer
+    raw.executescript(SCHEMA)
+    return SQLiteConnection(raw)
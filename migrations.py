@@ -0,0 +1,401 @@
+"""
+Versioned schema migrations for the portfolio database
+
+Applies the schema, performance indexes, the monthly totals rollup,
+sequence repairs and the data_version watermark in order. Each applied version is recorded in
+schema_migrations, so running this again only applies what is new.
+A Postgres advisory lock keeps two processes from migrating at once.
+
+Usage:
+    python migrations.py                # apply pending migrations
+    python migrations.py --status       # list applied / pending versions
+    python migrations.py --check-plans  # EXPLAIN the hot queries, fail on Seq Scan
+"""
+
+import argparse
+import sys
+
+from db_config import get_db_connection, close_connection
+from db_operations import _DASHBOARD_BUNDLE, _PORTFOLIO_DATA_STATS
+from setup_rollup import ROLLUP_DDL, ROLLUP_REBUILD
+
+
+# Arbitrary constant shared by every process running migrations
+MIGRATION_LOCK_ID = 724_310_001
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS investment_category (
+    category_id SERIAL PRIMARY KEY,
+    category_name VARCHAR(100) NOT NULL UNIQUE,
+    description VARCHAR(255),
+    is_active BOOLEAN DEFAULT TRUE,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_month (
+    month_id SERIAL PRIMARY KEY,
+    year SMALLINT NOT NULL,
+    month SMALLINT NOT NULL,
+    snapshot_date DATE NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT uq_year_month UNIQUE (year, month),
+    CONSTRAINT chk_month CHECK (month BETWEEN 1 AND 12)
+);
+
+CREATE TABLE IF NOT EXISTS portfolio_value (
+    value_id SERIAL PRIMARY KEY,
+    month_id INT NOT NULL,
+    category_id INT NOT NULL,
+    amount DECIMAL(15,2) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    CONSTRAINT fk_month
+        FOREIGN KEY (month_id) REFERENCES portfolio_month(month_id),
+    CONSTRAINT fk_category
+        FOREIGN KEY (category_id) REFERENCES investment_category(category_id),
+    UNIQUE (month_id, category_id)
+);
+"""
+
+INDEXES = """
+-- Joins / filters on category (UNIQUE (month_id, category_id) only covers month_id)
+CREATE INDEX IF NOT EXISTS idx_portfolio_value_category
+    ON portfolio_value (category_id);
+
+-- get_all_categories: active categories ordered by name
+CREATE INDEX IF NOT EXISTS idx_investment_category_active_name
+    ON investment_category (category_name)
+    WHERE is_active;
+"""
+
+SEQUENCE_REPAIR = """
+SELECT setval(pg_get_serial_sequence('investment_category', 'category_id'),
+              COALESCE(MAX(category_id), 0) + 1, false)
+FROM investment_category;
+
+SELECT setval(pg_get_serial_sequence('portfolio_month', 'month_id'),
+              COALESCE(MAX(month_id), 0) + 1, false)
+FROM portfolio_month;
+
+SELECT setval(pg_get_serial_sequence('portfolio_value', 'value_id'),
+              COALESCE(MAX(value_id), 0) + 1, false)
+FROM portfolio_value;
+"""
+
+DATA_VERSION = """
+-- One counter per table, bumped by every statement that writes to it.
+-- Caches compare these instead of re-running their queries.
+CREATE TABLE IF NOT EXISTS data_version (
+    table_name VARCHAR(63) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+INSERT INTO data_version (table_name)
+VALUES ('investment_category'), ('portfolio_month'), ('portfolio_value')
+ON CONFLICT (table_name) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION data_version_bump() RETURNS trigger AS $$
+BEGIN
+    UPDATE data_version
+    SET version = version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = TG_TABLE_NAME;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_data_version ON investment_category;
+CREATE TRIGGER trg_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON investment_category
+    FOR EACH STATEMENT EXECUTE FUNCTION data_version_bump();
+
+DROP TRIGGER IF EXISTS trg_data_version ON portfolio_month;
+CREATE TRIGGER trg_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON portfolio_month
+    FOR EACH STATEMENT EXECUTE FUNCTION data_version_bump();
+
+DROP TRIGGER IF EXISTS trg_data_version ON portfolio_value;
+CREATE TRIGGER trg_data_version
+    AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON portfolio_value
+    FOR EACH STATEMENT EXECUTE FUNCTION data_version_bump();
+"""
+
+# Also announce each write on the portfolio_data channel, so every app
+# process can evict its cache entries (see db_notify.py). NOTIFY is
+# delivered on commit, and duplicate notifications in one transaction
+# are folded into one.
+DATA_VERSION_NOTIFY = """
+CREATE OR REPLACE FUNCTION data_version_bump() RETURNS trigger AS $$
+BEGIN
+    UPDATE data_version
+    SET version = version + 1,
+        updated_at = CURRENT_TIMESTAMP
+    WHERE table_name = TG_TABLE_NAME;
+    PERFORM pg_notify('portfolio_data', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+"""
+
+# (version, name, sql) - append only; never edit an applied migration
+MIGRATIONS = [
+    (1, "baseline schema", SCHEMA),
+    (2, "performance indexes", INDEXES),
+    (3, "monthly totals rollup",
+     "LOCK TABLE portfolio_month, portfolio_value IN SHARE MODE;" + ROLLUP_DDL + ROLLUP_REBUILD),
+    (4, "repair serial sequences", SEQUENCE_REPAIR),
+    (5, "data version watermark", DATA_VERSION),
+    (6, "notify writes on portfolio_data", DATA_VERSION_NOTIFY),
+]
+
+
+def _ensure_migrations_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            name VARCHAR(255) NOT NULL,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def migrate() -> bool:
+    """
+    Apply every pending migration, each in its own transaction.
+
+    Returns:
+        bool: True if the database is now at the latest version
+    """
+    connection = get_db_connection()
+    if not connection:
+        print("[ERROR] Failed to connect to database")
+        return False
+
+    cursor = None
+    locked = False
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        locked = True
+
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT version FROM schema_migrations")
+        applied = {row[0] for row in cursor.fetchall()}
+        connection.commit()
+
+        pending = [m for m in MIGRATIONS if m[0] not in applied]
+        if not pending:
+            print("[INFO] Database is up to date.")
+            return True
+
+        for version, name, sql in pending:
+            print(f"[INFO] Applying {version:03d} {name}...")
+            cursor.execute(sql)
+            cursor.execute(
+                "INSERT INTO schema_migrations (version, name) VALUES (%s, %s)",
+                (version, name)
+            )
+            connection.commit()
+
+        print(f"[SUCCESS] Applied {len(pending)} migration(s).")
+        return True
+
+    except Exception as e:
+        print(f"[ERROR] Migration failed: {e}")
+        connection.rollback()
+        return False
+
+    finally:
+        if cursor:
+            if locked:
+                try:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+                    connection.commit()
+                except Exception:
+                    pass
+            cursor.close()
+        close_connection(connection)
+
+
+def status() -> list:
+    """
+    Returns:
+        list: (version, name, applied_at or None) for every known migration
+    """
+    connection = get_db_connection()
+    if not connection:
+        print("[ERROR] Failed to connect to database")
+        return []
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        _ensure_migrations_table(cursor)
+        cursor.execute("SELECT version, applied_at FROM schema_migrations")
+        applied = dict(cursor.fetchall())
+        connection.commit()
+        return [(version, name, applied.get(version)) for version, name, _ in MIGRATIONS]
+
+    except Exception as e:
+        print(f"[ERROR] Error reading migration status: {e}")
+        connection.rollback()
+        return []
+
+    finally:
+        if cursor:
+            cursor.close()
+        close_connection(connection)
+
+
+# ------------------------------------------------------------------
+# Query plan check
+# ------------------------------------------------------------------
+
+# The app's hot read paths (mirroring db_operations) with sample parameters;
+# the larger statements are db_operations' own
+HOT_QUERIES = [
+    ("get_all_categories", """
+        SELECT category_id, category_name, description, is_active, created_at
+        FROM investment_category
+        WHERE is_active = TRUE
+        ORDER BY category_name
+    """, ()),
+    ("month lookup (uq_year_month)", """
+        SELECT month_id FROM portfolio_month WHERE year = %s AND month = %s
+    """, (2024, 12)),
+    ("get_monthly_summary", """
+        SELECT pm.year, pm.month, pm.snapshot_date,
+               COALESCE(t.category_count, 0), COALESCE(t.total_value, 0)
+        FROM portfolio_month pm
+        LEFT JOIN portfolio_month_total t ON pm.month_id = t.month_id
+        WHERE pm.year = %s AND pm.month = %s
+    """, (2024, 12)),
+    ("get_portfolio_value_history", """
+        SELECT pm.year, pm.month, pm.snapshot_date, COALESCE(t.total_value, 0)
+        FROM portfolio_month pm
+        LEFT JOIN portfolio_month_total t ON pm.month_id = t.month_id
+        ORDER BY pm.year DESC, pm.month DESC
+        LIMIT %s
+    """, (6,)),
+    ("get_portfolio_data(year, month)", """
+        SELECT pm.year, pm.month, pm.snapshot_date, ic.category_name, pv.amount, pv.updated_at
+        FROM portfolio_value pv
+        JOIN portfolio_month pm ON pv.month_id = pm.month_id
+        JOIN investment_category ic ON pv.category_id = ic.category_id
+        WHERE pm.year = %s AND pm.month = %s
+        ORDER BY pm.year DESC, pm.month DESC, ic.category_name
+    """, (2024, 12)),
+    ("get_portfolio_data_page", """
+        SELECT pm.year, pm.month, pm.snapshot_date, ic.category_name, pv.amount, pv.updated_at
+        FROM portfolio_value pv
+        JOIN portfolio_month pm ON pv.month_id = pm.month_id
+        JOIN investment_category ic ON pv.category_id = ic.category_id
+        WHERE (pm.year, pm.month) < (%s, %s)
+           OR ((pm.year, pm.month) = (%s, %s) AND ic.category_name > %s)
+        ORDER BY pm.year DESC, pm.month DESC, ic.category_name
+        LIMIT %s
+    """, (2024, 12, 2024, 12, "", 101)),
+    ("get_portfolio_data_stats(year, month)", _PORTFOLIO_DATA_STATS + """
+        AND pm.year = %s AND pm.month = %s
+    """, (2024, 12)),
+    ("get_dashboard_bundle", _DASHBOARD_BUNDLE.format(month_totals="portfolio_month_total"),
+     {"year": 2024, "month": 12, "num_months": 6}),
+    ("values for one category", """
+        SELECT pv.month_id, pv.amount
+        FROM portfolio_value pv
+        WHERE pv.category_id = %s
+    """, (1,)),
+]
+
+
+# Full reads a hot query makes on purpose, so a Seq Scan there is expected:
+# the dashboard bundle lists every month for the month picker
+EXPECTED_SEQ_SCANS = {
+    "get_dashboard_bundle": {"portfolio_month"},
+}
+
+def _seq_scans(plan: dict) -> list:
+    """Relations read by a Seq Scan anywhere in an EXPLAIN (FORMAT JSON) plan tree."""
+    found = []
+    if plan.get("Node Type") == "Seq Scan":
+        found.append(plan.get("Relation Name", "?"))
+    for child in plan.get("Plans", []):
+        found.extend(_seq_scans(child))
+    return found
+
+
+def check_query_plans() -> bool:
+    """
+    EXPLAIN every hot query and report any that needs a sequential scan.
+
+    Plans are taken with enable_seqscan = off: on small tables Postgres
+    happily seq-scans anyway, but with seq scans penalised a Seq Scan
+    only survives when no usable index exists - which is what will hurt
+    once the history grows.
+
+    Returns:
+        bool: True if no hot query falls back to a sequential scan
+    """
+    connection = get_db_connection()
+    if not connection:
+        print("[ERROR] Failed to connect to database")
+        return False
+
+    cursor = None
+    failures = []
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SET LOCAL enable_seqscan = off")
+        for name, query, params in HOT_QUERIES:
+            cursor.execute("EXPLAIN (FORMAT JSON) " + query, params)
+            plan = cursor.fetchone()[0][0]["Plan"]
+            scans = [scan for scan in _seq_scans(plan) if scan not in EXPECTED_SEQ_SCANS.get(name, ())]
+            if scans:
+                failures.append(name)
+                print(f"   [FAIL] {name}: Seq Scan on {', '.join(scans)}")
+            else:
+                print(f"   [OK]   {name}")
+    except Exception as e:
+        print(f"[ERROR] Error checking query plans: {e}")
+        return False
+
+    finally:
+        connection.rollback()
+        if cursor:
+            cursor.close()
+        close_connection(connection)
+
+    if failures:
+        print(f"\n[ERROR] {len(failures)} hot query(ies) fall back to a sequential scan. Run: python migrations.py")
+        return False
+    print("\n[SUCCESS] All hot queries are index-backed.")
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Portfolio database migrations")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    parser.add_argument("--check-plans", action="store_true", help="fail if a hot query needs a Seq Scan")
+    args = parser.parse_args()
+
+    print("=" * 60)
+    print("Portfolio Database Migrations")
+    print("=" * 60)
+    print()
+
+    if args.status:
+        for version, name, applied_at in status():
+            state = applied_at.strftime("%d %b %Y %H:%M") if applied_at else "pending"
+            print(f"   {version:03d} {name:<30} {state}")
+        return 0
+
+    if args.check_plans:
+        return 0 if check_query_plans() else 1
+
+    return 0 if migrate() else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,139 @@
+"""
+Install the portfolio_month_total rollup
+
+portfolio_month_total keeps one row per month with its total value and
+category count. Statement-level triggers on portfolio_value and
+portfolio_month update it incrementally on every write, so the
+dashboard reads monthly totals without scanning portfolio_value.
+
+Safe to run more than once: the table and triggers are (re)created
+idempotently and the rollup is rebuilt from portfolio_value.
+"""
+
+from db_config import get_db_connection, close_connection
+
+
+ROLLUP_DDL = """
+CREATE TABLE IF NOT EXISTS portfolio_month_total (
+    month_id INT PRIMARY KEY REFERENCES portfolio_month(month_id) ON DELETE CASCADE,
+    total_value NUMERIC(18,2) NOT NULL DEFAULT 0,
+    category_count INT NOT NULL DEFAULT 0
+);
+
+-- New months start with an empty rollup row
+CREATE OR REPLACE FUNCTION portfolio_month_total_add_month() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO portfolio_month_total (month_id)
+    SELECT month_id FROM new_months
+    ON CONFLICT (month_id) DO NOTHING;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Apply the per-month deltas of one INSERT / UPDATE / DELETE statement
+CREATE OR REPLACE FUNCTION portfolio_month_total_apply() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        UPDATE portfolio_month_total t
+        SET total_value = t.total_value - d.total_value,
+            category_count = t.category_count - d.category_count
+        FROM (
+            SELECT month_id, SUM(amount) AS total_value, COUNT(*) AS category_count
+            FROM old_values
+            GROUP BY month_id
+        ) d
+        WHERE t.month_id = d.month_id;
+    END IF;
+
+    IF TG_OP IN ('INSERT', 'UPDATE') THEN
+        INSERT INTO portfolio_month_total AS t (month_id, total_value, category_count)
+        SELECT month_id, SUM(amount), COUNT(*)
+        FROM new_values
+        GROUP BY month_id
+        ON CONFLICT (month_id) DO UPDATE SET
+            total_value = t.total_value + EXCLUDED.total_value,
+            category_count = t.category_count + EXCLUDED.category_count;
+    END IF;
+
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_portfolio_month_total_month ON portfolio_month;
+CREATE TRIGGER trg_portfolio_month_total_month
+    AFTER INSERT ON portfolio_month
+    REFERENCING NEW TABLE AS new_months
+    FOR EACH STATEMENT EXECUTE FUNCTION portfolio_month_total_add_month();
+
+DROP TRIGGER IF EXISTS trg_portfolio_month_total_insert ON portfolio_value;
+CREATE TRIGGER trg_portfolio_month_total_insert
+    AFTER INSERT ON portfolio_value
+    REFERENCING NEW TABLE AS new_values
+    FOR EACH STATEMENT EXECUTE FUNCTION portfolio_month_total_apply();
+
+DROP TRIGGER IF EXISTS trg_portfolio_month_total_update ON portfolio_value;
+CREATE TRIGGER trg_portfolio_month_total_update
+    AFTER UPDATE ON portfolio_value
+    REFERENCING OLD TABLE AS old_values NEW TABLE AS new_values
+    FOR EACH STATEMENT EXECUTE FUNCTION portfolio_month_total_apply();
+
+DROP TRIGGER IF EXISTS trg_portfolio_month_total_delete ON portfolio_value;
+CREATE TRIGGER trg_portfolio_month_total_delete
+    AFTER DELETE ON portfolio_value
+    REFERENCING OLD TABLE AS old_values
+    FOR EACH STATEMENT EXECUTE FUNCTION portfolio_month_total_apply();
+"""
+
+ROLLUP_REBUILD = """
+INSERT INTO portfolio_month_total (month_id, total_value, category_count)
+SELECT pm.month_id, COALESCE(SUM(pv.amount), 0), COUNT(pv.value_id)
+FROM portfolio_month pm
+LEFT JOIN portfolio_value pv ON pv.month_id = pm.month_id
+GROUP BY pm.month_id
+ON CONFLICT (month_id) DO UPDATE SET
+    total_value = EXCLUDED.total_value,
+    category_count = EXCLUDED.category_count;
+"""
+
+
+def install_rollup():
+    """
+    Create the rollup table and triggers, then rebuild it from portfolio_value.
+
+    Writers are blocked (SHARE lock) for the duration, so no write can
+    slip in between the backfill and the triggers going live.
+    """
+    connection = get_db_connection()
+    if not connection:
+        print("[ERROR] Failed to connect to database")
+        return False
+
+    cursor = None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("LOCK TABLE portfolio_month, portfolio_value IN SHARE MODE")
+        cursor.execute(ROLLUP_DDL)
+        cursor.execute(ROLLUP_REBUILD)
+        cursor.execute("SELECT COUNT(*) FROM portfolio_month_total")
+        months = cursor.fetchone()[0]
+        connection.commit()
+        print(f"[SUCCESS] Rollup installed. {months} month(s) backfilled.")
+        return True
+
+    except Exception as e:
+        print(f"[ERROR] Error installing rollup: {e}")
+        connection.rollback()
+        return False
+
+    finally:
+        if cursor:
+            cursor.close()
+        close_connection(connection)
+
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Monthly Totals Rollup Setup")
+    print("=" * 60)
+    print()
+    install_rollup()
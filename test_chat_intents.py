@@ -0,0 +1,104 @@
+"""
+Tests for the chatbot's template fast path (chat_intents.answer)
+
+Runs against a throwaway SQLite database: 2024-01 .. 2025-06, so the
+latest month is June 2025 and May exists in both years.
+"""
+
+import os
+import tempfile
+from datetime import date
+
+import pytest
+
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "portfolio.db")
+
+import db_config  # noqa: E402
+
+if db_config.DB_BACKEND != "sqlite":
+    pytest.skip("db_config was already imported for another backend", allow_module_level=True)
+
+from chat_intents import answer  # noqa: E402
+from db_operations import add_category, get_all_categories, save_month_snapshot  # noqa: E402
+
+
+@pytest.fixture(scope="module", autouse=True)
+def portfolio():
+    for name in ("Stocks", "Bonds", "Gold"):
+        add_category(name)
+    ids = {c["category_name"]: c["category_id"] for c in get_all_categories()}
+    months = [(2024, month) for month in range(1, 13)] + [(2025, month) for month in range(1, 7)]
+    for index, (year, month) in enumerate(months):
+        # Totals rise and dip so the lowest / highest months are neither end
+        amount = 1000 + (index % 5) * 100
+        save_month_snapshot(year, month, date(year, month, 1), {
+            ids["Stocks"]: amount,
+            ids["Bonds"]: 500,
+            ids["Gold"]: 100 + index,
+        })
+
+
+@pytest.mark.parametrize("question", [
+    "What is my total portfolio value in 2024?",
+    "What was my portfolio value last year?",
+    "What was my portfolio value 3 months ago?",
+    "What was my portfolio value in the first month?",
+    "What is the lowest portfolio value?",
+    "What was my highest portfolio value ever?",
+    "minimum total portfolio value across months",
+    "Which category has the highest investment in 2024?",
+    "trend of my portfolio in 2024",
+    "What was my portfolio value two months ago?",
+    "What is my average portfolio value since 2025?",
+    "How much may my portfolio be worth?",
+])
+def test_goes_to_agent(question):
+    assert answer(question) is None
+
+
+def test_total_latest_month():
+    intent, output = answer("What is my total portfolio value?")
+    assert intent == "total"
+    assert "June 2025" in output
+
+
+def test_total_in_may():
+    intent, output = answer("What was my portfolio value in May?")
+    assert intent == "total"
+    assert "May 2025" in output
+
+
+def test_total_for_month_and_year():
+    intent, output = answer("What was my total portfolio value in May 2024?")
+    assert intent == "total"
+    assert "May 2024" in output
+
+
+def test_top_category():
+    intent, output = answer("Which category has the highest investment?")
+    assert intent == "top_category"
+    assert "**Stocks**" in output and "June 2025" in output
+
+
+def test_trend_last_n_months():
+    intent, output = answer("Show my portfolio trend over the last 3 months")
+    assert intent == "trend"
+    assert "last 3 months" in output
+
+
+def test_average():
+    intent, _ = answer("What is my average portfolio value?")
+    assert intent == "average"
+
+
+def test_compare():
+    intent, output = answer("Compare December 2024 vs January 2025")
+    assert intent == "compare"
+    assert "December 2024" in output and "January 2025" in output
+
+
+def test_breakdown_most_recent_month():
+    intent, output = answer("Show my portfolio for the most recent month")
+    assert intent == "breakdown"
+    assert "June 2025" in output
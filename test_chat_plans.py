@@ -0,0 +1,70 @@
+"""
+Tests for the chatbot's saved SQL plans (chat_plans)
+
+Runs against a throwaway SQLite database, with its own month (March 2023)
+so it does not disturb the chat_intents data when both share one file.
+"""
+
+import os
+import tempfile
+from datetime import date
+
+import pytest
+
+os.environ["DB_BACKEND"] = "sqlite"
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(), "portfolio.db")
+
+import db_config  # noqa: E402
+
+if db_config.DB_BACKEND != "sqlite":
+    pytest.skip("db_config was already imported for another backend", allow_module_level=True)
+
+from chat_plans import make_plan, question_shape, run_plan  # noqa: E402
+from db_operations import add_category, get_all_categories, save_month_snapshot  # noqa: E402
+
+
+@pytest.fixture(scope="module", autouse=True)
+def portfolio():
+    for name in ("Stocks", "Bonds", "Gold", "C01"):
+        add_category(name)
+    ids = {c["category_name"]: c["category_id"] for c in get_all_categories()}
+    save_month_snapshot(2023, 3, date(2023, 3, 1), {
+        ids["C01"]: 70,
+        ids["Stocks"]: 1000,
+        ids["Bonds"]: 500,
+        ids["Gold"]: 200,
+    })
+
+
+# The agent's answer to "How much more did I have in C01 than in Stocks in March 2023?"
+DIFFERENCE_SQL = """
+SELECT
+    (SELECT SUM(pv.amount) FROM portfolio_value pv
+     JOIN portfolio_month pm ON pv.month_id = pm.month_id
+     JOIN investment_category ic ON pv.category_id = ic.category_id
+     WHERE ic.category_name = 'C01' AND pm.year = 2023 AND pm.month = 3)
+  - (SELECT SUM(pv.amount) FROM portfolio_value pv
+     JOIN portfolio_month pm ON pv.month_id = pm.month_id
+     JOIN investment_category ic ON pv.category_id = ic.category_id
+     WHERE ic.category_name = 'Stocks' AND pm.year = 2023 AND pm.month = 3) AS difference
+"""
+
+
+def test_shape_keeps_question_order():
+    _, params = question_shape("How much more did I have in C01 than in Stocks in March 2023?")
+    assert params == [("category", "C01"), ("category", "Stocks"), ("month", (2023, 3))]
+
+    _, params = question_shape("Top 3 months in 2023 for Gold")
+    assert params == [("number", 3), ("year", 2023), ("category", "Gold")]
+
+
+def test_plan_binds_in_question_order():
+    shape, params = question_shape("How much more did I have in C01 than in Stocks in March 2023?")
+    plan = make_plan(DIFFERENCE_SQL, params)
+    assert plan is not None
+
+    # Same shape, categories of different name lengths in the other order
+    next_shape, next_params = question_shape("How much more did I have in Bonds than in Gold in March 2023?")
+    assert next_shape == shape
+    output = run_plan(plan, next_params)
+    assert output == "**difference**: 300.0"      # Bonds - Gold, not Gold - Bonds
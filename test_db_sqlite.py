@@ -0,0 +1,26 @@
+"""
+Tests for the SQLite backend's psycopg2 -> sqlite3 query translation
+"""
+
+from db_sqlite import connect_sqlite, translate
+
+
+def test_translate_placeholders_and_casts():
+    assert translate("SELECT * FROM t WHERE a = %s AND b = %s::int") == "SELECT * FROM t WHERE a = ? AND b = ?"
+    assert translate("SELECT * FROM t WHERE a = %(year)s") == "SELECT * FROM t WHERE a = :year"
+
+
+def test_translate_escaped_percent():
+    assert translate("SELECT 1 WHERE name LIKE '%%stocks%%'") == "SELECT 1 WHERE name LIKE '%stocks%'"
+    assert translate("SELECT 1 WHERE name LIKE '%%s' AND a = %s") == "SELECT 1 WHERE name LIKE '%s' AND a = ?"
+
+
+def test_like_query_runs(tmp_path):
+    connection = connect_sqlite(str(tmp_path / "portfolio.db"))
+    try:
+        cursor = connection.cursor()
+        cursor.execute("INSERT INTO investment_category (category_name) VALUES (%s)", ("US stocks",))
+        cursor.execute("SELECT category_name FROM investment_category WHERE category_name LIKE '%%stocks%%'")
+        assert cursor.fetchall() == [("US stocks",)]
+    finally:
+        connection.close()